@@ -0,0 +1,71 @@
+"""
+Compare vocalearn.alignment with the difflib.SequenceMatcher path it replaced,
+on synthetic reading passages of 10 to 2,000 words: time per alignment and the
+number of edits (miscues) each one reports.
+
+    python -m benchmarks.alignment [--repeat N] [--seed S]
+"""
+import argparse
+import difflib
+import random
+import string
+import time
+
+from vocalearn.alignment import align, edit_count
+
+SIZES = [10, 50, 200, 500, 1000, 2000]
+
+
+def make_passage(rng, size, vocabulary, weights):
+    # Zipf-distributed words, like real text: a few function words make up much of the passage.
+    reference = rng.choices(vocabulary, weights, k=size)
+    recognized = []
+    for word in reference:
+        roll = rng.random()
+        if roll < 0.05:
+            continue  # omission
+        if roll < 0.10:
+            recognized.append(rng.choice(vocabulary))  # mispronounced / misrecognized
+        else:
+            recognized.append(word.capitalize() if rng.random() < 0.1 else word)
+        if rng.random() < 0.03:
+            recognized.append(rng.choice(vocabulary))  # insertion
+    return reference, recognized
+
+
+def difflib_opcodes(reference, recognized):
+    # The alignment pronunciation_assesment_view used before vocalearn.alignment.
+    reference = [w.strip(string.punctuation) for w in reference]
+    return difflib.SequenceMatcher(None, reference, [w.lower() for w in recognized]).get_opcodes()
+
+
+def best_time(func, args, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 8))) for _ in range(2000)]
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+
+    print(f"{'words':>6} {'difflib ms':>11} {'aligner ms':>11} {'difflib edits':>14} {'aligner edits':>14}")
+    for size in SIZES:
+        reference, recognized = make_passage(rng, size, vocabulary, weights)
+        difflib_time, difflib_ops = best_time(difflib_opcodes, (reference, recognized), args.repeat)
+        aligner_time, aligner_ops = best_time(align, (reference, recognized), args.repeat)
+        print(f"{size:>6} {difflib_time * 1000:>11.2f} {aligner_time * 1000:>11.2f} "
+              f"{edit_count(difflib_ops):>14} {edit_count(aligner_ops):>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Load-test translate/, speech/ and pronunciation/ in-process against local
+stand-ins for Azure (see benchmarks.fakes), at several concurrency levels and
+clip lengths. Reports p50/p95/p99 latency, throughput and the process's peak RSS.
+
+    python -m benchmarks.endpoints [--requests N] [--concurrency 1,8,32]
+        [--clip-seconds 5,30] [--output results.json] [--baseline results.json]
+
+Inputs are generated from a fixed seed and the caches are disabled, so runs are
+comparable. With --baseline the run fails (exit status 1) when a scenario's p95
+latency or throughput is worse than the baseline's by more than --tolerance.
+"""
+import argparse
+import atexit
+import io
+import json
+import math
+import os
+import random
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+ENDPOINTS = ["translate", "speech", "pronunciation"]
+
+
+def configure(translator_url, use_cache):
+    """Point the app at the fakes; must run before Django and vocalearn are imported."""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "vocalearn_backend.settings")
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ.setdefault("CORS_ALLOWED_ORIGINS", "http://localhost:5173")
+    os.environ["DJANGO_ALLOWED_HOSTS"] = "testserver"
+    os.environ["AZURE_TRANSLATE_API_ENDPOINT_TEXT"] = translator_url
+    os.environ["AZURE_TRANSLATE_KEY"] = "benchmark"
+    os.environ["AZURE_SPEECH_KEY"] = ""
+    # Keep recognizer session events out of the report.
+    os.environ.setdefault("SPEECH_EVENT_LOG_LEVEL", "WARNING")
+    # Every simulated client shares one address, so per-client limits would reject most of the load.
+    os.environ.setdefault("ADMISSION_CONTROL_ENABLED", "false")
+    if not use_cache:
+        for prefix in ("TRANSLATION_CACHE", "SPEECH_RESULT_CACHE"):
+            os.environ[f"{prefix}_MAX_BYTES"] = "0"
+            os.environ[f"{prefix}_SHARED_BACKEND"] = ""
+
+    import django
+    django.setup()
+
+    # A migrated throwaway database, so that the app finds its tables (e.g. for job recovery on the first
+    # request) and nothing is left in the repository.
+    from django.conf import settings
+    from django.core.management import call_command
+
+    directory = tempfile.mkdtemp(prefix="vocalearn-benchmark-")
+    atexit.register(shutil.rmtree, directory, ignore_errors=True)
+    settings.DATABASES["default"]["NAME"] = os.path.join(directory, "db.sqlite3")
+    call_command("migrate", verbosity=0)
+
+
+def make_clip(seconds, rng):
+    """A 16 kHz mono WAV of alternating tone bursts and pauses, like read speech."""
+    frames = bytearray()
+    while len(frames) < seconds * 32000:
+        for i in range(int(16000 * rng.uniform(0.3, 1.2))):
+            sample = int(6000 * math.sin(i * rng.uniform(0.05, 0.3))) + rng.randint(-200, 200)
+            frames += sample.to_bytes(2, "little", signed=True)
+        frames += bytes(2 * int(16000 * rng.uniform(0.1, 0.4)))
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(16000)
+        wav.writeframes(bytes(frames[:seconds * 32000]))
+    return buffer.getvalue()
+
+
+def make_request(endpoint, payload, index):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+
+    if endpoint == "translate":
+        # Distinct texts, so concurrent requests are not coalesced into one call.
+        return "/vocalearn/translate/", {"text": f"{index}. {payload}", "to": "fr"}, "application/json"
+
+    data = {"audio": SimpleUploadedFile("clip.wav", payload["audio"], "audio/wav"), "target_language": "en-US"}
+    if endpoint == "pronunciation":
+        data["reference_text"] = payload["reference_text"]
+    return f"/vocalearn/{endpoint}/", data, None
+
+
+def run_scenario(endpoint, payload, concurrency, requests):
+    from django.test import Client
+
+    local = threading.local()
+
+    def call(index):
+        if not hasattr(local, "client"):
+            local.client = Client()
+        path, data, content_type = make_request(endpoint, payload, index)
+        kwargs = {"content_type": content_type} if content_type else {}
+        start = time.perf_counter()
+        response = local.client.post(path, data, **kwargs)
+        return time.perf_counter() - start, response.status_code
+
+    call(-1)  # warm-up: imports, connection pool, first config builds
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(call, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in results)
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": requests,
+        "errors": sum(1 for _, code in results if code != 200),
+        "p50_ms": percentiles[49] * 1000,
+        "p95_ms": percentiles[94] * 1000,
+        "p99_ms": percentiles[98] * 1000,
+        "throughput_rps": requests / elapsed,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for key, result in results.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        if result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{key}: p95 {before['p95_ms']:.1f} -> {result['p95_ms']:.1f} ms")
+        if result["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{key}: throughput {before['throughput_rps']:.1f} -> {result['throughput_rps']:.1f} req/s")
+    return regressions
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int_list, default=[1, 8, 32])
+    parser.add_argument("--clip-seconds", type=int_list, default=[5, 30])
+    parser.add_argument("--requests", type=int, default=32, help="requests per scenario")
+    parser.add_argument("--text-characters", type=int, default=500)
+    parser.add_argument("--translator-latency", type=float, default=0.05, help="seconds per Translator call")
+    parser.add_argument("--recognizer-latency", type=float, default=0.1, help="seconds of session setup")
+    parser.add_argument("--realtime-factor", type=float, default=0.02,
+                        help="recognition time as a fraction of the audio duration")
+    parser.add_argument("--cache", action="store_true", help="leave the translation and result caches enabled")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    from benchmarks.fakes import FakeTranslator, fake_speech_sdk, load_fixture
+
+    rng = random.Random(args.seed)
+    endpoints = args.endpoints.split(",")
+    results = {}
+
+    with FakeTranslator(args.translator_latency) as translator:
+        configure(translator.url, args.cache)
+
+        with fake_speech_sdk(args.recognizer_latency, args.realtime_factor):
+            reference_text = load_fixture("pronunciation.json")["reference_text"]
+            words = reference_text.split()
+            text = " ".join(rng.choice(words) for _ in range(args.text_characters // 5))[:args.text_characters]
+            clips = {seconds: make_clip(seconds, rng) for seconds in args.clip_seconds}
+
+            print(f"{'scenario':<28} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8} {'errors':>7} {'peak RSS MB':>12}")
+            for endpoint in endpoints:
+                sizes = [None] if endpoint == "translate" else args.clip_seconds
+                for seconds in sizes:
+                    payload = text if seconds is None else {"audio": clips[seconds], "reference_text": reference_text}
+                    for concurrency in args.concurrency:
+                        key = f"{endpoint}" + (f" {seconds}s" if seconds else "") + f" c={concurrency}"
+                        result = results[key] = run_scenario(endpoint, payload, concurrency, args.requests)
+                        print(f"{key:<28} {result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f} "
+                              f"{result['throughput_rps']:>8.1f} {result['errors']:>7} {result['peak_rss_mb']:>12.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Local stand-ins for the Azure services, so the endpoints can be benchmarked
+without keys or network access:
+
+* FakeTranslator: a threaded HTTP server speaking the Translator v3 /translate
+  protocol, answering after a fixed latency.
+* fake_speech_sdk(): patches the Speech SDK classes the app constructs with
+  fakes that replay the recorded results in benchmarks/fixtures.
+"""
+import contextlib
+import itertools
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import azure.cognitiveservices.speech as speechsdk
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# Seconds of audio each replayed segment stands for; Azure emits a final result per utterance.
+SEGMENT_SECONDS = 5
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return json.load(f)
+
+
+class FakeTranslator:
+    """Translator v3 /translate stand-in: every text comes back tagged with its target language."""
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.requests = 0
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately; without this, delayed ACKs add ~40 ms per call.
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                languages = parse_qs(urlparse(self.path).query).get("to", [])
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                time.sleep(fake.latency)
+                fake.requests += 1
+
+                data = json.dumps([
+                    {"translations": [{"text": f"[{language}] {item['text']}", "to": language} for language in languages]}
+                    for item in body
+                ]).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+            request_queue_size = 256
+
+        self.server = Server(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeSignal:
+    def __init__(self):
+        self.callbacks = []
+
+    def connect(self, callback):
+        self.callbacks.append(callback)
+
+    def fire(self, evt):
+        for callback in self.callbacks:
+            callback(evt)
+
+
+class FakeResult:
+    def __init__(self, text, json_result=None):
+        self.text = text
+        self.properties = {speechsdk.PropertyId.SpeechServiceResponse_JsonResult: json_result}
+
+
+class FakeEvent:
+    def __init__(self, text="", json_result=None, session_id="fake-session"):
+        self.session_id = session_id
+        self.result = FakeResult(text, json_result)
+
+
+class FakeAudioConfig:
+    """Replaces get_audio_config: keeps only the clip length the replay needs."""
+
+    def __init__(self, pcm):
+        self.duration = len(pcm) / 32000
+
+
+class FakeSpeechConfig:
+    def __init__(self, *args, region=None, **kwargs):
+        self.region = region
+        self.speech_recognition_language = None
+
+
+class FakeProperties:
+    def __init__(self, region):
+        self.region = region
+
+    def get_property(self, property_id):
+        return self.region
+
+
+class FakePronunciationConfig:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def enable_prosody_assessment(self):
+        pass
+
+    def apply_to(self, recognizer):
+        recognizer.assessing = True
+
+
+class FakeRecognizer:
+    """
+    Continuous recognizer that replays recorded segments from a background
+    thread, like the SDK does: one final result per SEGMENT_SECONDS of audio,
+    each after ``realtime_factor`` times that much time, with interim
+    hypotheses in between, after ``latency`` seconds of session setup.
+    """
+
+    latency = 0.1
+    realtime_factor = 0.02
+    recognition = None
+    pronunciation = None
+
+    def __init__(self, speech_config=None, audio_config=None):
+        self.duration = audio_config.duration if audio_config is not None else SEGMENT_SECONDS
+        self.assessing = False
+        self.properties = FakeProperties(speech_config.region if speech_config is not None else None)
+        self.stopped = threading.Event()
+        for name in ("recognizing", "recognized", "session_started", "session_stopped", "canceled"):
+            setattr(self, name, FakeSignal())
+
+    def start_continuous_recognition(self):
+        threading.Thread(target=self._replay, daemon=True).start()
+
+    def stop_continuous_recognition(self):
+        self.stopped.set()
+
+    def _replay(self):
+        self.session_started.fire(FakeEvent())
+        if self.stopped.wait(self.latency):
+            return
+
+        count = max(1, round(self.duration / SEGMENT_SECONDS))
+        fixture = self.pronunciation if self.assessing else self.recognition
+        segment_time = min(self.duration, SEGMENT_SECONDS) * self.realtime_factor
+        for segment in itertools.islice(itertools.cycle(fixture["segments"]), count):
+            if self.assessing:
+                partials, text, json_result = [], segment["DisplayText"], json.dumps(segment)
+            else:
+                partials, text, json_result = segment["partials"], segment["text"], None
+
+            for partial in partials:
+                if self.stopped.wait(segment_time / (len(partials) + 1)):
+                    return
+                self.recognizing.fire(FakeEvent(partial))
+            if self.stopped.wait(segment_time / (len(partials) + 1)):
+                return
+            self.recognized.fire(FakeEvent(text, json_result))
+
+        self.session_stopped.fire(FakeEvent())
+
+
+@contextlib.contextmanager
+def fake_speech_sdk(latency=0.1, realtime_factor=0.02):
+    """Route every recognizer the app builds to FakeRecognizer for the duration of the block."""
+    from vocalearn import pronunciation, recognition, speech_pool
+
+    FakeRecognizer.latency = latency
+    FakeRecognizer.realtime_factor = realtime_factor
+    FakeRecognizer.recognition = load_fixture("recognition.json")
+    FakeRecognizer.pronunciation = load_fixture("pronunciation.json")
+
+    patches = [
+        mock.patch.object(speechsdk, "SpeechRecognizer", FakeRecognizer),
+        mock.patch.object(speechsdk, "SpeechConfig", FakeSpeechConfig),
+        mock.patch.object(speechsdk, "PronunciationAssessmentConfig", FakePronunciationConfig),
+        mock.patch.object(recognition, "get_audio_config", FakeAudioConfig),
+        mock.patch.object(pronunciation, "get_audio_config", FakeAudioConfig),
+    ]
+    with contextlib.ExitStack() as stack:
+        for patch in patches:
+            stack.enter_context(patch)
+        # Configs built before the patch would be real SDK objects.
+        for pool in (speech_pool.speech_configs, speech_pool.pronunciation_configs):
+            pool._items.clear()
+        yield
@@ -1,3 +1,16 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Job, Passage
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'queue', 'status', 'user', 'audio_duration', 'created_at', 'finished_at']
+    list_filter = ['kind', 'queue', 'status']
+
+
+@admin.register(Passage)
+class PassageAdmin(admin.ModelAdmin):
+    list_display = ['id', 'title', 'language', 'word_count', 'created_by', 'created_at']
+    list_filter = ['language']
+    readonly_fields = ['tokens', 'word_count']
@@ -0,0 +1,385 @@
+"""
+Admission control for the endpoints that call Azure.
+
+Each scope (translate, speech, pronunciation) has:
+
+* a token bucket per client, so one client cannot exceed RATE requests per
+  second beyond a BURST (429 with Retry-After). DRF views get it as a
+  throttle class, the async views through admission_control;
+* a per-client concurrency limit (429 as soon as it is exceeded);
+* a share of a global concurrency pool per upstream service. speech and
+  pronunciation share the 'speech' pool, since they count against the same
+  Azure Speech concurrency limit. A request that finds the pool full waits up
+  to MAX_WAIT seconds, with at most MAX_QUEUED requests waiting per worker,
+  and gets a 503 otherwise.
+
+A request that fans out into several upstream calls, like a pronunciation
+batch, spends a token per clip and holds a global slot per concurrent session.
+
+Buckets and concurrency slots live in the ADMISSION_CONTROL['CACHE'] cache.
+With memcached or Redis every worker sees the same counts; with the default
+local-memory cache each worker process counts its own. A slot is a cache entry
+created with add(), held for the request and deleted afterwards; LEASE_TIMEOUT
+frees the slots of a worker that died mid-request. Backends with an atomic
+add() (memcached, Redis, local memory) count exactly.
+"""
+import asyncio
+import functools
+import random
+import threading
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.response import Response
+from rest_framework.throttling import BaseThrottle
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from . import metrics
+from .executor import run_in_executor
+
+POLL_INTERVAL = 0.025
+MAX_POLL_INTERVAL = 0.25
+
+
+class Rejected(Exception):
+    def __init__(self, message, status_code, retry_after):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def get_config():
+    return settings.ADMISSION_CONTROL
+
+
+def get_cache():
+    return caches[get_config()["CACHE"]]
+
+
+def client_key(request, user):
+    """Authenticated users are limited per account, anonymous clients per address."""
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"ip:{BaseThrottle().get_ident(request)}"
+
+
+def jwt_client_key(request):
+    """
+    client_key for views outside DRF, which do not authenticate the JWT
+    themselves. Looks the user up in the database, so call it off the event loop.
+    """
+    try:
+        authenticated = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        authenticated = None
+    return client_key(request, authenticated[0] if authenticated is not None else request.user)
+
+
+def take_token(scope, key, cost=1):
+    """
+    Spend ``cost`` tokens from ``key``'s bucket for ``scope``; returns 0, or the
+    seconds until they are available. A cost above BURST pays a full bucket.
+    """
+    config = get_config()["SCOPES"][scope]
+    rate, burst = config["RATE"], config["BURST"]
+    cost = min(cost, burst)
+    cache = get_cache()
+    cache_key = f"admission:bucket:{scope}:{key}"
+
+    now = time.time()
+    tokens, updated = cache.get(cache_key, (burst, now))
+    tokens = min(burst, tokens + (now - updated) * rate)
+    if tokens < cost:
+        return (cost - tokens) / rate
+
+    # Idle buckets refill completely, so they only need to outlive the refill time.
+    cache.set(cache_key, (tokens - cost, now), timeout=int(burst / rate) + 1)
+    return 0
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """DRF throttle spending from the scope's token bucket; subclasses set ``scope``."""
+
+    scope = None
+
+    def allow_request(self, request, view):
+        if not get_config()["ENABLED"]:
+            return True
+        self.wait_seconds = take_token(self.scope, client_key(request, request.user), self.cost(request))
+        if self.wait_seconds:
+            metrics.admission_rejections.inc(scope=self.scope, reason="rate")
+            return False
+        return True
+
+    def cost(self, request):
+        return 1
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class TranslateThrottle(TokenBucketThrottle):
+    scope = "translate"
+
+
+class SpeechThrottle(TokenBucketThrottle):
+    scope = "speech"
+
+
+class PronunciationThrottle(TokenBucketThrottle):
+    scope = "pronunciation"
+
+
+class PronunciationBatchThrottle(PronunciationThrottle):
+    """Charges a token per uploaded clip."""
+
+    def cost(self, request):
+        return max(1, len(request.FILES.getlist("audio")))
+
+
+class SlotPool:
+    """``size`` concurrency slots shared through the cache under ``name``."""
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+
+    def try_acquire(self):
+        cache = get_cache()
+        lease = uuid.uuid4().hex
+        # Start at a random slot so concurrent callers do not all race for slot 0.
+        start = random.randrange(self.size) if self.size else 0
+        for offset in range(self.size):
+            slot = f"admission:slot:{self.name}:{(start + offset) % self.size}"
+            if cache.add(slot, lease, timeout=get_config()["LEASE_TIMEOUT"]):
+                return slot, lease
+        return None
+
+    def release(self, held):
+        slot, lease = held
+        cache = get_cache()
+        # Only free the slot if it is still ours; it may have expired and been taken over.
+        if cache.get(slot) == lease:
+            cache.delete(slot)
+
+
+class Waiters:
+    """Per-worker count of requests waiting for a global slot, bounded by MAX_QUEUED."""
+
+    def __init__(self):
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def enter(self):
+        with self._lock:
+            if self._count >= get_config()["MAX_QUEUED"]:
+                return False
+            self._count += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self._count -= 1
+
+
+waiters = Waiters()
+
+
+class Admission:
+    """
+    The slots one request holds while it runs: one of the client's, and
+    ``sessions`` global ones, taken all at once. acquire() raises Rejected.
+    """
+
+    def __init__(self, scope, key, sessions=1):
+        config = get_config()
+        scope_config = config["SCOPES"][scope]
+        self.scope = scope
+        self.user_pool = SlotPool(f"{scope}:{key}", scope_config["USER_CONCURRENCY"])
+        self.global_pool = SlotPool(scope_config["POOL"], config["POOLS"][scope_config["POOL"]])
+        self.sessions = max(1, min(sessions, self.global_pool.size))
+        self.held = []
+
+    def _reject(self, reason, message, status_code, retry_after=1):
+        self.release()
+        metrics.admission_rejections.inc(scope=self.scope, reason=reason)
+        raise Rejected(message, status_code, retry_after)
+
+    def _acquire_user_slot(self):
+        held = self.user_pool.try_acquire()
+        if held is None:
+            self._reject("user_concurrency", "Too many concurrent requests, wait for one to finish.",
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+        self.held.append((self.user_pool, held))
+
+    def _try_global_slot(self):
+        # All or nothing: requests holding part of what they need could block each other.
+        taken = []
+        for _ in range(self.sessions):
+            held = self.global_pool.try_acquire()
+            if held is None:
+                for held in taken:
+                    self.global_pool.release(held)
+                return False
+            taken.append(held)
+        self.held += [(self.global_pool, held) for held in taken]
+        return True
+
+    def _admit_now(self):
+        """Take the client's slot and, if one is free, a global one; otherwise join the wait queue."""
+        self._acquire_user_slot()
+        if self._try_global_slot():
+            return True
+        if not waiters.enter():
+            self._reject("queue_full", "The service is busy, try again later.", status.HTTP_503_SERVICE_UNAVAILABLE)
+        metrics.admission_waiting.inc(scope=self.scope)
+        return False
+
+    def _stop_waiting(self):
+        waiters.leave()
+        metrics.admission_waiting.dec(scope=self.scope)
+
+    def _backoff(self):
+        deadline = time.monotonic() + get_config()["MAX_WAIT"]
+        interval = POLL_INTERVAL
+        while time.monotonic() < deadline:
+            yield min(interval, max(deadline - time.monotonic(), 0))
+            interval = min(interval * 2, MAX_POLL_INTERVAL)
+
+    def _timed_out(self):
+        self._reject("wait_timeout", "The service is busy, try again later.", status.HTTP_503_SERVICE_UNAVAILABLE,
+                     retry_after=get_config()["MAX_WAIT"])
+
+    def acquire(self):
+        if self._admit_now():
+            return
+        try:
+            for delay in self._backoff():
+                time.sleep(delay)
+                if self._try_global_slot():
+                    return
+        finally:
+            self._stop_waiting()
+        self._timed_out()
+
+    async def acquire_async(self):
+        """
+        Same as acquire(), but waits on the event loop instead of holding a thread;
+        the cache calls run on the executor.
+        """
+        if await run_in_executor(self._admit_now):
+            return
+        try:
+            for delay in self._backoff():
+                await asyncio.sleep(delay)
+                if await run_in_executor(self._try_global_slot):
+                    return
+        except BaseException:
+            # Cancelled while waiting, e.g. the client went away: give back the client's slot.
+            await run_in_executor(self.release)
+            raise
+        finally:
+            self._stop_waiting()
+        await run_in_executor(self._timed_out)
+
+    def release(self):
+        while self.held:
+            pool, held = self.held.pop()
+            pool.release(held)
+
+
+def admission_control(scope, sessions=None):
+    """
+    Hold a per-client and a global concurrency slot for ``scope`` while the view
+    runs; ``sessions(request)``, if given, is how many upstream sessions the
+    request runs at once, each holding a global slot. Goes under @api_view for
+    DRF views, so that request.user is the JWT-authenticated user. On async
+    views it authenticates the JWT itself and also applies the token bucket,
+    which DRF views get from their throttle class. Streaming responses keep
+    their slots until the stream is finished.
+    """
+    def decorator(func):
+        if iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_view(request, *args, **kwargs):
+                if not get_config()["ENABLED"]:
+                    return await func(request, *args, **kwargs)
+
+                # Off the thread that serves the sync views: authentication queries the database.
+                key = await sync_to_async(jwt_client_key, thread_sensitive=False)(request)
+                admission = Admission(scope, key, sessions(request) if sessions is not None else 1)
+                try:
+                    wait = await run_in_executor(take_token, scope, key)
+                    if wait:
+                        metrics.admission_rejections.inc(scope=scope, reason="rate")
+                        raise Rejected("Request was throttled.", status.HTTP_429_TOO_MANY_REQUESTS, wait)
+                    await admission.acquire_async()
+                    response = await func(request, *args, **kwargs)
+                except Rejected as e:
+                    return JsonResponse({"error": str(e)}, status=e.status_code,
+                                        headers={"Retry-After": retry_after(e)})
+                except BaseException:
+                    await run_in_executor(admission.release)
+                    raise
+                if not getattr(response, "streaming", False):
+                    await run_in_executor(admission.release)
+                    return response
+                return release_after(admission, response)
+
+            return async_view
+
+        @functools.wraps(func)
+        def view(request, *args, **kwargs):
+            if not get_config()["ENABLED"]:
+                return func(request, *args, **kwargs)
+
+            admission = Admission(scope, client_key(request, request.user),
+                                  sessions(request) if sessions is not None else 1)
+            try:
+                admission.acquire()
+            except Rejected as e:
+                return Response({"error": str(e)}, status=e.status_code, headers={"Retry-After": retry_after(e)})
+
+            try:
+                response = func(request, *args, **kwargs)
+            except BaseException:
+                admission.release()
+                raise
+            return release_after(admission, response)
+
+        return view
+    return decorator
+
+
+def retry_after(rejection):
+    return str(max(1, round(rejection.retry_after)))
+
+
+def release_after(admission, response):
+    if not getattr(response, "streaming", False):
+        admission.release()
+        return response
+
+    content = response.streaming_content
+    if hasattr(content, "__aiter__"):
+        async def release_when_done():
+            try:
+                async for chunk in content:
+                    yield chunk
+            finally:
+                await run_in_executor(admission.release)
+    else:
+        def release_when_done():
+            try:
+                yield from content
+            finally:
+                admission.release()
+
+    response.streaming_content = release_when_done()
+    return response
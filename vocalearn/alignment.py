@@ -0,0 +1,130 @@
+"""
+Minimal edit-distance alignment of reference and recognized word sequences.
+
+Words are mapped to integer IDs through a pluggable normalizer, so variants such
+as "Hello," and "hello" compare equal. The Levenshtein DP is computed with the
+bit-parallel formulation of Myers/Hyyrö: each column of the DP matrix is a pair
+of bit vectors (one bit per reference word) updated with a handful of integer
+operations, so a whole column costs about as much as a single cell of a plain
+Python DP. The per-column delta vectors are kept for an O(n + m) traceback.
+"""
+import string
+
+# ASCII plus the Unicode punctuation learners' transcripts and passages commonly contain.
+PUNCTUATION = string.punctuation + "“”‘’„‚«»‹›…—–‐‑·、，。！？；：（）【】《》〈〉「」『』¡¿"
+
+
+def normalize_word(word):
+    """Default equality key: case-insensitive, ignoring leading and trailing punctuation."""
+    return word.casefold().strip(PUNCTUATION)
+
+
+def encode(reference_words, recognized_words, normalize=normalize_word):
+    """Map both sequences to integer word IDs, normalizing each distinct spelling once."""
+    keys = {}
+    ids = {}
+
+    def word_id(word):
+        key = keys.get(word)
+        if key is None:
+            key = keys[word] = ids.setdefault(normalize(word), len(ids))
+        return key
+
+    return [word_id(w) for w in reference_words], [word_id(w) for w in recognized_words]
+
+
+def delta_columns(reference, recognized):
+    """
+    Run the bit-parallel DP over integer-encoded sequences.
+
+    Returns four lists indexed by column j (0..m). Bit i-1 of ``vp[j]``/``vn[j]``
+    is set when D[i][j] - D[i-1][j] is +1/-1. Bit i-1 of ``hp[j]``/``hn[j]`` is
+    set when D[i][j] - D[i][j-1] is +1/-1.
+    """
+    n = len(reference)
+    full = (1 << n) - 1
+
+    match_masks = {}
+    for i, word in enumerate(reference):
+        match_masks[word] = match_masks.get(word, 0) | (1 << i)
+
+    vp, vn = full, 0
+    vps, vns, hps, hns = [vp], [vn], [0], [0]
+    for word in recognized:
+        eq = match_masks.get(word, 0)
+        xv = eq | vn
+        xh = (((eq & vp) + vp) ^ vp) | eq
+        hp = vn | (~(xh | vp) & full)
+        hn = vp & xh
+        hps.append(hp)
+        hns.append(hn)
+        # Row 0 is D[0][j] = j, so every column shifts in a +1 horizontal delta.
+        hp = ((hp << 1) | 1) & full
+        hn = (hn << 1) & full
+        vp = hn | (~(xv | hp) & full)
+        vn = hp & xv
+        vps.append(vp)
+        vns.append(vn)
+
+    return vps, vns, hps, hns
+
+
+def _popcount(value):
+    return bin(value).count("1")
+
+
+def distance(reference_words, recognized_words, normalize=normalize_word):
+    reference, recognized = encode(reference_words, recognized_words, normalize)
+    vps, vns, _, _ = delta_columns(reference, recognized)
+    return len(recognized) + _popcount(vps[-1]) - _popcount(vns[-1])
+
+
+def align(reference_words, recognized_words, normalize=normalize_word):
+    """
+    Return difflib-style opcodes ``(tag, i1, i2, j1, j2)`` describing a minimal
+    alignment, with tags 'equal', 'replace', 'delete' and 'insert'.
+    """
+    reference, recognized = encode(reference_words, recognized_words, normalize)
+    vps, vns, hps, hns = delta_columns(reference, recognized)
+
+    def delta(positive, negative, bit):
+        return 1 if positive & bit else -1 if negative & bit else 0
+
+    i, j = len(reference), len(recognized)
+    cost = j + _popcount(vps[j]) - _popcount(vns[j])
+    steps = []
+    while i > 0 and j > 0:
+        bit = 1 << (i - 1)
+        left = cost - delta(hps[j], hns[j], bit)              # D[i][j-1]
+        diagonal = left - delta(vps[j - 1], vns[j - 1], bit)  # D[i-1][j-1]
+        same = reference[i - 1] == recognized[j - 1]
+        if cost == diagonal + (not same):
+            steps.append("equal" if same else "replace")
+            i, j, cost = i - 1, j - 1, diagonal
+        elif vps[j] & bit:
+            # D[i][j] == D[i-1][j] + 1
+            steps.append("delete")
+            i, cost = i - 1, cost - 1
+        else:
+            steps.append("insert")
+            j, cost = j - 1, left
+    steps += ["delete"] * i + ["insert"] * j
+    steps.reverse()
+
+    opcodes = []
+    i = j = 0
+    for tag in steps:
+        di = tag != "insert"
+        dj = tag != "delete"
+        if opcodes and opcodes[-1][0] == tag:
+            _, i1, _, j1, _ = opcodes[-1]
+            opcodes[-1] = (tag, i1, i + di, j1, j + dj)
+        else:
+            opcodes.append((tag, i, i + di, j, j + dj))
+        i += di
+        j += dj
+    return opcodes
+
+
+def edit_count(opcodes):
+    return sum(max(i2 - i1, j2 - j1) for tag, i1, i2, j1, j2 in opcodes if tag != "equal")
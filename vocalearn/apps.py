@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class VocalearnConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'vocalearn'
+
+    def ready(self):
+        from django.core.signals import request_started
+
+        from . import jobs, segmentation, speech_pool
+
+        request_started.connect(jobs.recover_jobs, dispatch_uid='vocalearn.recover_jobs')
+
+        speech_pool.warm_up(settings.SPEECH_CONFIG_POOL['WARM_LANGUAGES'])
+        if settings.CHINESE_SEGMENTATION['PRELOAD']:
+            segmentation.warm_up()
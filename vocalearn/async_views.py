@@ -0,0 +1,321 @@
+import functools
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+
+from .admission import admission_control
+from .audio import AudioDecodeError, DecoderUnavailable
+from .cache import speech_result_cache
+from .documents import translate_document_async, translate_document_stream
+from .executor import run_in_executor
+from .models import Passage
+from .pronunciation import create_pronunciation_recognizer, score_pronunciation
+from .recognition import (
+    create_transcription_recognizer, run_continuous_recognition_async, stream_continuous_recognition,
+    get_recognition_timeout, RecognitionFailed, RecognitionTimeout,
+)
+from .resilience import CircuitOpen
+from .translator import translate_texts_async, max_characters_per_request, TranslationError
+from .uploads import upload_digest
+from . import metrics, views
+from .workspace import WorkspaceFull
+
+logger = logging.getLogger(__name__)
+
+
+class BadRequest(Exception):
+    pass
+
+
+def async_api_view(http_method_names):
+    """
+    Minimal async replacement for DRF's @api_view, which only supports sync views:
+    restricts the allowed methods and exempts the view from CSRF like DRF does.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def view(request, *args, **kwargs):
+            if request.method not in http_method_names:
+                return JsonResponse({"error": f"Invalid request method. Use {', '.join(http_method_names)}."}, status=405)
+            try:
+                return await func(request, *args, **kwargs)
+            except BadRequest as e:
+                return JsonResponse({"error": str(e)}, status=400)
+
+        view.csrf_exempt = True
+        return view
+    return decorator
+
+
+def _parse_form(request):
+    return request.POST, request.FILES
+
+
+async def get_request_data(request):
+    """Return ``(data, files)``; multipart bodies are parsed off the event loop."""
+    if request.content_type == "application/json":
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            raise BadRequest("Request body is not valid JSON.")
+        if not isinstance(data, dict):
+            raise BadRequest("Request body must be a JSON object.")
+        return data, {}
+    with metrics.stage("upload"):
+        return await run_in_executor(_parse_form, request)
+
+
+async def decode_upload(audio_file, endpoint):
+    return await run_in_executor(views.decode_upload, audio_file, endpoint)
+
+
+@async_api_view(['POST'])
+@admission_control("translate")
+async def translate_text_async_view(request):
+    data, _ = await get_request_data(request)
+    text = data.get("text")
+    target_language = data.get("to")
+
+    if not text or not target_language:
+        return JsonResponse({"error": "Both 'text' and 'to' fields are required."}, status=400)
+    if not isinstance(text, str) or not isinstance(target_language, str):
+        return JsonResponse({"error": "'text' and 'to' must be strings."}, status=400)
+
+    if len(text) > settings.TRANSLATION_DOCUMENT["MAX_CHARACTERS"]:
+        return JsonResponse({"error": "Text exceeds the translation size limit.",
+                             "details": {"max_characters": settings.TRANSLATION_DOCUMENT["MAX_CHARACTERS"]}},
+                            status=400)
+
+    try:
+        if len(text) > max_characters_per_request:
+            # Too large for one Translator call: split at sentence boundaries instead.
+            translation = await translate_document_async(text, target_language)
+        else:
+            translation = (await translate_texts_async([text], [target_language]))[0][target_language]
+        return JsonResponse({"translation": translation})
+
+    except TranslationError as e:
+        return JsonResponse({"error": str(e), "details": e.details}, status=e.status_code)
+
+    except Exception as e:
+        return JsonResponse({"error": "An error occurred.", "details": str(e)}, status=500)
+
+
+@async_api_view(['POST'])
+@admission_control("translate")
+async def translate_document_stream_view(request):
+    """
+    Translate reading material of any size. The text is split at sentence
+    boundaries and the chunks are translated concurrently; each ``chunk`` event
+    carries the next piece of the translation in order, followed by ``done`` or
+    ``error``.
+    """
+    data, _ = await get_request_data(request)
+    text = data.get("text")
+    target_language = data.get("to")
+    max_characters = settings.TRANSLATION_DOCUMENT["MAX_CHARACTERS"]
+
+    if not text or not target_language:
+        return JsonResponse({"error": "Both 'text' and 'to' fields are required."}, status=400)
+    if not isinstance(text, str) or not isinstance(target_language, str):
+        return JsonResponse({"error": "'text' and 'to' must be strings."}, status=400)
+    if len(text) > max_characters:
+        return JsonResponse({"error": "Text exceeds the translation size limit.",
+                             "details": {"max_characters": max_characters}}, status=400)
+
+    return event_stream(document_events(text, target_language))
+
+
+async def document_events(text, target_language):
+    try:
+        async for index, count, translation in translate_document_stream(text, target_language):
+            yield sse_event("chunk", {"index": index, "count": count, "translation": translation})
+    except TranslationError as e:
+        yield sse_event("error", {"error": str(e), "details": e.details, "status": e.status_code})
+        return
+    except Exception as e:
+        logger.error(f"Error during document translation: {e}", exc_info=True)
+        yield sse_event("error", {"error": "An error occurred.", "details": str(e), "status": 500})
+        return
+
+    yield sse_event("done", {"status": "success"})
+
+
+@async_api_view(['POST'])
+@admission_control("speech")
+async def speech_to_text_async_view(request):
+    data, files = await get_request_data(request)
+    audio_file = files.get("audio")
+    target_language = data.get('target_language')
+
+    if not audio_file:
+        return JsonResponse({"error": "No audio file uploaded."}, status=400)
+
+    cache_key = speech_result_cache.make_key("transcription", upload_digest(request, "audio"), target_language)
+    cached = await run_in_executor(speech_result_cache.get, cache_key)
+    if cached is not None:
+        return JsonResponse({"status": "success", **cached})
+
+    try:
+        pcm, preprocessing = await decode_upload(audio_file, "transcription")
+    except AudioDecodeError as e:
+        return JsonResponse({"error": f"Could not decode the audio file: {e}"}, status=400)
+    except DecoderUnavailable:
+        return JsonResponse({"error": "Audio decoding is unavailable."}, status=500)
+    except WorkspaceFull as e:
+        return JsonResponse({"error": str(e)}, status=503)
+
+    try:
+        speech_recognizer, recognized_text = await run_in_executor(create_transcription_recognizer, pcm, target_language)
+        await run_continuous_recognition_async(speech_recognizer, get_recognition_timeout(pcm))
+        result = {"transcription": " ".join(recognized_text), "preprocessing": preprocessing}
+        await run_in_executor(speech_result_cache.set, cache_key, result)
+        return JsonResponse({"status": "success", **result})
+
+    except RecognitionTimeout as e:
+        return JsonResponse({"error": str(e)}, status=504)
+
+    except RecognitionFailed as e:
+        return JsonResponse({"error": str(e)}, status=502)
+
+    except CircuitOpen as e:
+        return JsonResponse({"error": str(e)}, status=503)
+
+    except Exception as e:
+        logger.error(f"Error during continuous recognition: {e}", exc_info=True)
+        return JsonResponse({"error": f"Error during continuous recognition: {str(e)}"}, status=500)
+
+
+@async_api_view(['POST'])
+@admission_control("speech")
+async def speech_to_text_stream_view(request):
+    """
+    Streaming variant of the speech endpoint. Answers with Server-Sent Events:
+    ``recognizing`` for each interim hypothesis, ``recognized`` for each final
+    segment, then ``done`` with the full transcription, or ``error``. Clients
+    read the body incrementally (fetch + ReadableStream, since EventSource
+    cannot POST).
+    """
+    data, files = await get_request_data(request)
+    audio_file = files.get("audio")
+    target_language = data.get('target_language')
+
+    if not audio_file:
+        return JsonResponse({"error": "No audio file uploaded."}, status=400)
+
+    cache_key = speech_result_cache.make_key("transcription", upload_digest(request, "audio"), target_language)
+    cached = await run_in_executor(speech_result_cache.get, cache_key)
+    if cached is not None:
+        return event_stream(cached_transcription_events(cached))
+
+    try:
+        pcm, preprocessing = await decode_upload(audio_file, "transcription")
+    except AudioDecodeError as e:
+        return JsonResponse({"error": f"Could not decode the audio file: {e}"}, status=400)
+    except DecoderUnavailable:
+        return JsonResponse({"error": "Audio decoding is unavailable."}, status=500)
+    except WorkspaceFull as e:
+        return JsonResponse({"error": str(e)}, status=503)
+
+    return event_stream(transcription_events(pcm, target_language, cache_key, preprocessing))
+
+
+def event_stream(events):
+    # X-Accel-Buffering stops nginx from holding the events back until the response ends.
+    return StreamingHttpResponse(
+        events, content_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def cached_transcription_events(result):
+    yield sse_event("done", {"status": "success", **result})
+
+
+async def transcription_events(pcm, target_language, cache_key, preprocessing):
+    try:
+        speech_recognizer, recognized_text = await run_in_executor(create_transcription_recognizer, pcm, target_language)
+        async for event, text in stream_continuous_recognition(speech_recognizer, get_recognition_timeout(pcm)):
+            yield sse_event(event, {"text": text})
+
+    except RecognitionTimeout as e:
+        yield sse_event("error", {"error": str(e), "status": 504})
+        return
+
+    except RecognitionFailed as e:
+        yield sse_event("error", {"error": str(e), "status": 502})
+        return
+
+    except CircuitOpen as e:
+        yield sse_event("error", {"error": str(e), "status": 503})
+        return
+
+    except Exception as e:
+        logger.error(f"Error during streaming recognition: {e}", exc_info=True)
+        yield sse_event("error", {"error": f"Error during continuous recognition: {str(e)}", "status": 500})
+        return
+
+    result = {"transcription": " ".join(recognized_text), "preprocessing": preprocessing}
+    await run_in_executor(speech_result_cache.set, cache_key, result)
+    yield sse_event("done", {"status": "success", **result})
+
+
+@async_api_view(['POST'])
+@admission_control("pronunciation")
+async def pronunciation_assesment_async_view(request):
+    data, files = await get_request_data(request)
+    audio_file = files.get('audio')
+    try:
+        # The lookup needs no thread affinity; the default would queue it behind any running sync view.
+        reference_text, target_language, reference_words = await sync_to_async(
+            views.get_reference, thread_sensitive=False
+        )(data)
+    except Passage.DoesNotExist:
+        return JsonResponse({"error": "Passage not found."}, status=404)
+
+    if not audio_file or not target_language or not reference_text:
+        return JsonResponse({"error": "Something is missing"}, status=400)
+
+    details = views.is_truthy(data.get('details'))
+    cache_key = speech_result_cache.make_key(
+        "pronunciation-details" if details else "pronunciation", upload_digest(request, "audio"), target_language,
+        reference_text,
+    )
+    cached = await run_in_executor(speech_result_cache.get, cache_key)
+    if cached is not None:
+        return JsonResponse({"status": "success", **cached})
+
+    try:
+        pcm, preprocessing = await decode_upload(audio_file, "pronunciation")
+    except AudioDecodeError as e:
+        return JsonResponse({"error": f"Could not decode the audio file: {e}"}, status=400)
+    except DecoderUnavailable:
+        return JsonResponse({"error": "Audio decoding is unavailable."}, status=500)
+    except WorkspaceFull as e:
+        return JsonResponse({"error": str(e)}, status=503)
+
+    try:
+        speech_recognizer, results = await run_in_executor(
+            create_pronunciation_recognizer, pcm, reference_text, target_language
+        )
+        await run_continuous_recognition_async(speech_recognizer, get_recognition_timeout(pcm))
+    except RecognitionTimeout as e:
+        return JsonResponse({"error": str(e)}, status=504)
+    except RecognitionFailed as e:
+        return JsonResponse({"error": str(e)}, status=502)
+    except CircuitOpen as e:
+        return JsonResponse({"error": str(e)}, status=503)
+
+    scores = await run_in_executor(
+        score_pronunciation, results, reference_text, target_language, reference_words=reference_words,
+        include_words=details, offset=preprocessing["leading_seconds"],
+    )
+    scores["preprocessing"] = preprocessing
+    await run_in_executor(speech_result_cache.set, cache_key, scores)
+    return JsonResponse({"status": "success", **scores})
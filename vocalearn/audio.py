@@ -0,0 +1,189 @@
+import logging
+import os
+import re
+import struct
+import subprocess
+import warnings
+from collections import namedtuple
+
+from django.conf import settings
+
+import azure.cognitiveservices.speech as speechsdk
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    try:
+        import audioop
+    except ImportError:
+        audioop = None
+
+# Format expected by the Azure Speech SDK: 16 kHz, mono, 16-bit signed little-endian PCM.
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+CHANNELS = 1
+BYTES_PER_SECOND = SAMPLE_RATE * SAMPLE_WIDTH * CHANNELS
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+WavInfo = namedtuple("WavInfo", ["channels", "sample_rate", "sample_width", "data_offset", "data_size"])
+
+# ffmpeg errors meaning the container needs a seekable input, rather than that the upload is broken.
+UNSEEKABLE_INPUT = re.compile(r"moov atom not found|seek", re.IGNORECASE)
+
+logger = logging.getLogger(__name__)
+
+
+class AudioDecodeError(Exception):
+    pass
+
+
+class DecoderUnavailable(Exception):
+    """ffmpeg could not be started; a server fault, unlike AudioDecodeError."""
+
+
+def get_processed_audio(audio_file, workspace):
+    """
+    Decode an uploaded file to raw PCM in the recognizer's format. The request's
+    workspace is only written to when the container cannot be decoded from a pipe.
+    """
+    audio_file.seek(0)
+    header = audio_file.read(4096)
+    info = probe_wav(header)
+    if info is not None and is_cheaply_convertible(info):
+        audio_file.seek(info.data_offset)
+        pcm = convert_pcm(audio_file.read(info.data_size), info)
+        if not pcm:
+            raise AudioDecodeError("The audio file contains no samples.")
+        return pcm
+
+    if hasattr(audio_file, "temporary_file_path"):
+        # Large uploads are already spooled to disk by Django; let ffmpeg read them in place.
+        return _run_ffmpeg(audio_file.temporary_file_path(), None)
+
+    audio_file.seek(0)
+    data = audio_file.read()
+    try:
+        return _run_ffmpeg("pipe:0", data)
+    except AudioDecodeError as e:
+        # Containers with their index at the end (e.g. some m4a) cannot be read from a pipe.
+        if not UNSEEKABLE_INPUT.search(str(e)):
+            raise
+        return _decode_seekable(data, audio_file.name, workspace)
+
+
+def probe_wav(header):
+    """
+    Parse the RIFF header of a WAV upload. Returns None for anything that is not
+    integer PCM, so that it goes through ffmpeg instead.
+    """
+    if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        return None
+
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(header):
+        chunk_id, chunk_size = struct.unpack_from("<4sI", header, offset)
+        body = offset + 8
+
+        if chunk_id == b"fmt " and chunk_size >= 16 and body + 16 <= len(header):
+            format_tag, channels, sample_rate, _, block_align, bits = struct.unpack_from("<HHIIHH", header, body)
+            if format_tag == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 40 and body + 26 <= len(header):
+                # The sub-format GUID starts with the actual format tag.
+                format_tag = struct.unpack_from("<H", header, body + 24)[0]
+            if format_tag != WAVE_FORMAT_PCM or bits % 8 or block_align != channels * bits // 8:
+                return None
+            fmt = (channels, sample_rate, bits // 8)
+
+        elif chunk_id == b"data":
+            if fmt is None:
+                return None
+            channels, sample_rate, sample_width = fmt
+            # Streaming recorders leave the size at 0 or 0xFFFFFFFF; the read is clamped to the file anyway.
+            data_size = chunk_size if 0 < chunk_size < 0xFFFFFFFF else -1
+            return WavInfo(channels, sample_rate, sample_width, body, data_size)
+
+        offset = body + chunk_size + (chunk_size & 1)
+
+    return None
+
+
+def is_cheaply_convertible(info):
+    if (info.channels, info.sample_rate, info.sample_width) == (CHANNELS, SAMPLE_RATE, SAMPLE_WIDTH):
+        return True
+    # Width and channel changes are single passes over the buffer; resampling is left to ffmpeg.
+    return (
+        audioop is not None
+        and info.sample_rate == SAMPLE_RATE
+        and info.channels in (1, 2)
+        and info.sample_width in (1, 2, 3, 4)
+    )
+
+
+def convert_pcm(data, info):
+    frame_size = info.channels * info.sample_width
+    data = data[:len(data) - len(data) % frame_size]
+
+    if info.sample_width != SAMPLE_WIDTH:
+        if info.sample_width == 1:
+            # 8-bit WAV is unsigned, every other width is signed.
+            data = audioop.bias(data, 1, -128)
+        data = audioop.lin2lin(data, info.sample_width, SAMPLE_WIDTH)
+
+    if info.channels == 2:
+        data = audioop.tomono(data, SAMPLE_WIDTH, 0.5, 0.5)
+
+    return data
+
+
+def _decode_seekable(data, name, workspace):
+    path = workspace.file_path(name, size=len(data))
+    with open(path, "wb") as f:
+        f.write(data)
+    try:
+        return _run_ffmpeg(path, None)
+    finally:
+        os.remove(path)
+
+
+def _run_ffmpeg(source, data):
+    command = [
+        settings.FFMPEG_BINARY, "-hide_banner", "-loglevel", "error",
+        *(["-nostdin"] if data is None else []),
+        "-i", source,
+        "-f", "s16le", "-acodec", "pcm_s16le", "-ac", str(CHANNELS), "-ar", str(SAMPLE_RATE),
+        "pipe:1",
+    ]
+    try:
+        process = subprocess.run(
+            command,
+            input=data,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=settings.FFMPEG_TIMEOUT,
+        )
+    except OSError as e:
+        logger.error(f"Could not run ffmpeg: {e}", exc_info=True)
+        raise DecoderUnavailable(f"Could not run ffmpeg: {e}") from e
+    except subprocess.TimeoutExpired as e:
+        raise AudioDecodeError(f"Decoding took longer than {settings.FFMPEG_TIMEOUT} seconds.") from e
+
+    if process.returncode != 0 or not process.stdout:
+        raise AudioDecodeError(process.stderr.decode("utf-8", "replace").strip() or "No audio decoded.")
+
+    return process.stdout
+
+
+def get_audio_config(pcm):
+    """Feed decoded PCM straight into the recognizer through a push stream."""
+    stream_format = speechsdk.audio.AudioStreamFormat(
+        samples_per_second=SAMPLE_RATE, bits_per_sample=SAMPLE_WIDTH * 8, channels=CHANNELS
+    )
+    stream = speechsdk.audio.PushAudioInputStream(stream_format=stream_format)
+    stream.write(pcm)
+    stream.close()
+    return speechsdk.audio.AudioConfig(stream=stream)
+
+
+def get_duration(pcm):
+    return len(pcm) / BYTES_PER_SECOND
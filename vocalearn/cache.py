@@ -0,0 +1,206 @@
+import hashlib
+import json
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class LRUCache:
+    """In-process LRU cache bounded by entry count, total size in bytes and TTL."""
+
+    def __init__(self, max_entries, max_bytes, ttl):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+
+            value, size, expires_at = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, size):
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+            self._data[key] = (value, size, time.monotonic() + self.ttl)
+            self._bytes += size
+
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+
+def normalize_text(text):
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class TwoTierCache:
+    """
+    A per-worker LRU in front of an optional Django cache backend that is shared
+    by every worker. Subclasses name their settings (MAX_ENTRIES, MAX_BYTES, TTL,
+    SHARED_BACKEND) and key prefix, and say how big a value is.
+    """
+
+    settings_name = None
+    key_prefix = None
+    # Counters reported by stats() besides hits and misses
+    extra_counters = ()
+
+    def __init__(self, max_entries, max_bytes, ttl, shared_alias=None):
+        self.local = LRUCache(max_entries, max_bytes, ttl)
+        self.ttl = ttl
+        self.shared_alias = shared_alias
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        for counter in self.extra_counters:
+            setattr(self, counter, 0)
+
+    @classmethod
+    def from_settings(cls):
+        config = getattr(settings, cls.settings_name)
+        return cls(
+            max_entries=config["MAX_ENTRIES"],
+            max_bytes=config["MAX_BYTES"],
+            ttl=config["TTL"],
+            shared_alias=config["SHARED_BACKEND"] or None,
+        )
+
+    @property
+    def shared(self):
+        if self.shared_alias is None:
+            return None
+        return caches[self.shared_alias]
+
+    def size_of(self, value):
+        raise NotImplementedError
+
+    def _hash_key(self, *parts):
+        digest = hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+        return f"{self.key_prefix}:{digest}"
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            self._record("local_hits")
+            return value
+
+        if self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.local.set(key, value, self.size_of(value))
+                self._record("shared_hits")
+                return value
+
+        self._record("misses")
+        return None
+
+    def set(self, key, value):
+        self.local.set(key, value, self.size_of(value))
+        if self.shared is not None:
+            self.shared.set(key, value, timeout=self.ttl)
+
+    def clear(self):
+        self.local.clear()
+
+    def _record(self, counter, amount=1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def stats(self):
+        hits = self.local_hits + self.shared_hits
+        lookups = hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            **{counter: getattr(self, counter) for counter in self.extra_counters},
+            "local_entries": len(self.local),
+            "local_bytes": self.local.size_bytes,
+        }
+
+
+class TranslationCache(TwoTierCache):
+    """Translations by target language and normalized source text."""
+
+    settings_name = "TRANSLATION_CACHE"
+    key_prefix = "translation"
+    extra_counters = ("saved_characters",)
+
+    def make_key(self, text, target_language, api_version):
+        return self._hash_key(api_version, target_language.strip().lower(), normalize_text(text))
+
+    def size_of(self, translation):
+        return _size_of(translation)
+
+    def get(self, text, target_language, api_version):
+        translation = super().get(self.make_key(text, target_language, api_version))
+        if translation is not None:
+            self._record("saved_characters", len(text))
+        return translation
+
+    def set(self, text, target_language, api_version, translation):
+        super().set(self.make_key(text, target_language, api_version), translation)
+
+
+class SpeechResultCache(TwoTierCache):
+    """
+    Cache of speech-to-text and pronunciation results, keyed by the digest of the
+    uploaded audio bytes plus the parameters that affect the result. A hit skips
+    the decode and the Azure call entirely.
+    """
+
+    settings_name = "SPEECH_RESULT_CACHE"
+    key_prefix = "speech-result"
+
+    def make_key(self, kind, audio_digest, *params):
+        return self._hash_key(kind, audio_digest, *(normalize_text(p or "") for p in params))
+
+    def size_of(self, result):
+        return _size_of(json.dumps(result))
+
+
+def _size_of(value):
+    return len(value.encode("utf-8"))
+
+
+translation_cache = TranslationCache.from_settings()
+speech_result_cache = SpeechResultCache.from_settings()
@@ -0,0 +1,142 @@
+"""
+Translation of texts larger than a single Translator request: the text is split
+at sentence boundaries into chunks of at most TRANSLATION_DOCUMENT['CHUNK_CHARACTERS'],
+the chunks are translated concurrently, and the translations are put back
+together in order with the original whitespace between them.
+"""
+import asyncio
+import re
+
+from django.conf import settings
+
+from . import metrics
+from .executor import get_document_executor
+from .translator import translate_texts, translate_texts_async
+
+# End of a sentence (Latin or CJK punctuation, closing quotes/brackets, trailing
+# space) or a paragraph break.
+SENTENCE_BOUNDARY = re.compile(
+    r'[.!?…]+["\'”’»)\]]*\s+'
+    r'|[。！？]+["”’」』）]*\s*'
+    r'|\n\s*\n'
+)
+
+
+def split_sentences(text):
+    """Split ``text`` into sentences, each keeping the whitespace that follows it."""
+    sentences = []
+    start = 0
+    for match in SENTENCE_BOUNDARY.finditer(text):
+        sentences.append(text[start:match.end()])
+        start = match.end()
+    if start < len(text):
+        sentences.append(text[start:])
+    return sentences
+
+
+def _split_long(sentence, limit):
+    """Cut a sentence longer than ``limit`` at whitespace, or anywhere if it has none."""
+    while len(sentence) > limit:
+        cut = sentence.rfind(" ", 0, limit) + 1 or limit
+        yield sentence[:cut]
+        sentence = sentence[cut:]
+    if sentence:
+        yield sentence
+
+
+def chunk_text(text, limit=None):
+    """Pack consecutive sentences of ``text`` into chunks of at most ``limit`` characters."""
+    limit = limit or settings.TRANSLATION_DOCUMENT["CHUNK_CHARACTERS"]
+    chunks = []
+    current = ""
+    for sentence in split_sentences(text):
+        for piece in _split_long(sentence, limit):
+            if current and len(current) + len(piece) > limit:
+                chunks.append(current)
+                current = ""
+            current += piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+LINE_BREAK = re.compile(r"\s*\n\s*")
+
+
+def _layout(chunk):
+    """
+    Split a chunk into the lines sent to Azure and the whitespace around them:
+    ``(leading, lines, gaps, trailing)``. The translator normalizes whitespace
+    inside each text, so line and paragraph breaks are kept out of it.
+    """
+    body = chunk.strip()
+    if not body:
+        return chunk, [], [], ""
+    start = chunk.index(body)
+    return chunk[:start], LINE_BREAK.split(body), LINE_BREAK.findall(body), chunk[start + len(body):]
+
+
+def _assemble(layout, translations):
+    leading, lines, gaps, trailing = layout
+    pieces = [leading]
+    for index, translation in enumerate(translations):
+        pieces.append(translation)
+        if index < len(gaps):
+            pieces.append(gaps[index])
+    pieces.append(trailing)
+    return "".join(pieces)
+
+
+def _translate_chunk(layout, target_language):
+    if not layout[1]:
+        return _assemble(layout, [])
+    translations = translate_texts(layout[1], [target_language])
+    return _assemble(layout, [t[target_language] for t in translations])
+
+
+def translate_document(text, target_language):
+    """
+    Translate a text of any size from a sync view. The chunks are translated
+    concurrently on the document executor, which runs at most
+    TRANSLATION_DOCUMENT['CONCURRENCY'] of them at once in each worker.
+    """
+    executor = get_document_executor()
+    futures = [
+        metrics.submit(executor, _translate_chunk, _layout(chunk), target_language)
+        for chunk in chunk_text(text)
+    ]
+    try:
+        return "".join(future.result() for future in futures)
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+async def translate_document_async(text, target_language):
+    """Async counterpart of translate_document, returning the whole translation at once."""
+    return "".join([translation async for _, _, translation in translate_document_stream(text, target_language)])
+
+
+async def translate_document_stream(text, target_language):
+    """
+    Translate a text of any size, yielding ``(index, count, translation)`` for
+    each chunk in order as soon as it and every chunk before it are done. At most
+    TRANSLATION_DOCUMENT['CONCURRENCY'] chunks are in flight at once.
+    """
+    layouts = [_layout(chunk) for chunk in chunk_text(text)]
+    semaphore = asyncio.Semaphore(settings.TRANSLATION_DOCUMENT["CONCURRENCY"])
+
+    async def translate(layout):
+        if not layout[1]:
+            return _assemble(layout, [])
+        async with semaphore:
+            translations = await translate_texts_async(layout[1], [target_language])
+        return _assemble(layout, [t[target_language] for t in translations])
+
+    tasks = [asyncio.ensure_future(translate(layout)) for layout in layouts]
+    try:
+        for index, task in enumerate(tasks):
+            yield index, len(tasks), await task
+    finally:
+        for task in tasks:
+            task.cancel()
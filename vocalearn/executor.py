@@ -0,0 +1,58 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+_executors = {}
+_lock = threading.Lock()
+
+
+def _get_pool(name, max_workers):
+    # Pools are per process: threads do not survive a fork, so a forked worker builds its own.
+    pid = os.getpid()
+    pool = _executors.get(name)
+    if pool is None or pool[1] != pid:
+        with _lock:
+            pool = _executors.get(name)
+            if pool is None or pool[1] != pid:
+                pool = _executors[name] = (
+                    ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"vocalearn-{name}"),
+                    pid,
+                )
+    return pool[0]
+
+
+def get_executor():
+    """Bounded pool for CPU and blocking SDK work started from async views."""
+    return _get_pool("worker", settings.ASYNC_EXECUTOR_WORKERS)
+
+
+def get_recognition_executor():
+    """Bounded pool of recognizer sessions for the chunks of split recordings."""
+    return _get_pool("recognition", settings.SPEECH_SPLITTING["MAX_SESSIONS"])
+
+
+def get_batch_executor():
+    """Bounded pool for the clips of batch pronunciation requests."""
+    return _get_pool("batch", settings.PRONUNCIATION_BATCH["CONCURRENCY"])
+
+
+def get_document_executor():
+    """Bounded pool for the chunks of long texts translated from sync views."""
+    return _get_pool("document", settings.TRANSLATION_DOCUMENT["CONCURRENCY"])
+
+
+def get_hedge_executor():
+    """Pool running the attempts of hedged upstream calls from sync views."""
+    return _get_pool("hedge", settings.UPSTREAM_RESILIENCE["HEDGE_WORKERS"])
+
+
+async def run_in_executor(func, *args, **kwargs):
+    # The caller's context goes along, so work done on the pool still counts toward the request's metrics.
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), functools.partial(context.run, func, *args, **kwargs))
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import threading
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_session = None
+_session_pid = None
+_async_client = None
+_async_client_loop = None
+_lock = threading.Lock()
+
+
+def build_session():
+    config = settings.AZURE_HTTP
+    retry = Retry(
+        total=config["MAX_RETRIES"],
+        connect=config["MAX_RETRIES"],
+        read=config["MAX_RETRIES"],
+        status=config["MAX_RETRIES"],
+        backoff_factor=config["BACKOFF_FACTOR"],
+        status_forcelist=RETRY_STATUSES,
+        # Translator calls are idempotent, so POSTs are safe to retry.
+        allowed_methods=frozenset(["GET", "POST"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=config["POOL_CONNECTIONS"],
+        pool_maxsize=config["POOL_MAXSIZE"],
+        max_retries=retry,
+    )
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session():
+    """
+    Return the keep-alive session shared by every thread of this worker.
+
+    A new session is built after a fork so gunicorn workers never share
+    sockets inherited from the master process.
+    """
+    global _session, _session_pid
+
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _lock:
+            if _session is None or _session_pid != pid:
+                _session = build_session()
+                _session_pid = pid
+    return _session
+
+
+def default_timeout():
+    return (settings.AZURE_HTTP["CONNECT_TIMEOUT"], settings.AZURE_HTTP["READ_TIMEOUT"])
+
+
+def post(url, **kwargs):
+    kwargs.setdefault("timeout", default_timeout())
+    return get_session().post(url, **kwargs)
+
+
+def get(url, **kwargs):
+    kwargs.setdefault("timeout", default_timeout())
+    return get_session().get(url, **kwargs)
+
+
+def get_async_client():
+    """Return the keep-alive httpx client for the running event loop."""
+    global _async_client, _async_client_loop
+
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client_loop is not loop:
+        config = settings.AZURE_HTTP
+        _async_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=config["POOL_MAXSIZE"],
+                max_keepalive_connections=config["POOL_MAXSIZE"],
+            ),
+            timeout=httpx.Timeout(config["READ_TIMEOUT"], connect=config["CONNECT_TIMEOUT"]),
+            transport=httpx.AsyncHTTPTransport(retries=config["MAX_RETRIES"]),
+        )
+        _async_client_loop = loop
+    return _async_client
+
+
+async def async_post(url, **kwargs):
+    """POST with the same bounded retry and backoff policy as the sync session."""
+    config = settings.AZURE_HTTP
+    client = get_async_client()
+
+    for attempt in range(config["MAX_RETRIES"] + 1):
+        last_attempt = attempt == config["MAX_RETRIES"]
+        try:
+            response = await client.post(url, **kwargs)
+        except httpx.TimeoutException:
+            if last_attempt:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUSES or last_attempt:
+                return response
+        await asyncio.sleep(config["BACKOFF_FACTOR"] * (2 ** attempt))
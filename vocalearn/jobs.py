@@ -0,0 +1,239 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+
+from .audio import get_duration
+from .models import Job
+from .pronunciation import create_pronunciation_recognizer, score_pronunciation
+from .recognition import (
+    create_transcription_recognizer, run_continuous_recognition, get_recognition_timeout, transcribe_split,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobQueue:
+    """
+    In-process queue backed by the Job table: a bounded thread pool runs at most
+    ``concurrency`` jobs at a time, and at most ``max_pending`` may wait.
+    """
+
+    def __init__(self, name, concurrency, max_pending):
+        self.name = name
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"job-{name}")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, job):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFull(f"The {self.name} queue is full, try again later.")
+            self._pending += 1
+        self._executor.submit(self._run, job.pk)
+
+    def _run(self, job_id):
+        try:
+            run_job(job_id)
+        finally:
+            with self._lock:
+                self._pending -= 1
+            close_old_connections()
+
+
+_queues = {}
+_queues_pid = None
+_queues_lock = threading.Lock()
+_last_purge = 0
+_recovered_pid = None
+
+
+def get_queue(name):
+    global _queues, _queues_pid
+
+    pid = os.getpid()
+    with _queues_lock:
+        if _queues_pid != pid:
+            _queues = {}
+            _queues_pid = pid
+        if name not in _queues:
+            config = settings.JOB_QUEUES[name]
+            _queues[name] = JobQueue(name, config["CONCURRENCY"], config["MAX_PENDING"])
+        return _queues[name]
+
+
+def submit_job(kind, pcm, params, user=None):
+    """Persist the decoded audio and a pending Job, then hand it to the queue for its kind."""
+    purge_expired_jobs()
+
+    job = Job(kind=kind, queue=kind, params=params, audio_duration=get_duration(pcm),
+              user=user if user is not None and user.is_authenticated else None)
+
+    os.makedirs(settings.JOB_AUDIO_ROOT, exist_ok=True)
+    job.audio_path = os.path.join(settings.JOB_AUDIO_ROOT, f"{job.pk}.pcm")
+    with open(job.audio_path, "wb") as f:
+        f.write(pcm)
+
+    job.save()
+    try:
+        get_queue(job.queue).submit(job)
+    except QueueFull:
+        _delete_audio(job)
+        job.delete()
+        raise
+    return job
+
+
+def run_job(job_id):
+    # Claim the job: after a restart it may be queued in several workers, or it may have been purged.
+    claimed = Job.objects.filter(pk=job_id, status=Job.STATUS_PENDING).update(
+        status=Job.STATUS_RUNNING, started_at=timezone.now()
+    )
+    if not claimed:
+        return
+    try:
+        job = Job.objects.get(pk=job_id)
+    except Job.DoesNotExist:
+        return
+
+    try:
+        with open(job.audio_path, "rb") as f:
+            pcm = f.read()
+        job.result = JOB_RUNNERS[job.kind](pcm, **job.params)
+        job.status = Job.STATUS_SUCCEEDED
+    except Exception as e:
+        logger.error(f"Job {job.pk} failed: {e}", exc_info=True)
+        job.error = str(e)
+        job.status = Job.STATUS_FAILED
+    finally:
+        _delete_audio(job)
+
+    job.finished_at = timezone.now()
+    saved = Job.objects.filter(pk=job.pk).update(
+        status=job.status, result=job.result, error=job.error, finished_at=job.finished_at
+    )
+    if not saved:
+        logger.warning(f"Job {job.pk} was deleted while it ran; its result is dropped.")
+
+
+# ``offset`` is the silence trimmed off the start of the upload; jobs queued before it was recorded have none.
+def transcribe(pcm, target_language=None, split=False, offset=0.0):
+    if split:
+        return transcribe_split(pcm, target_language, offset)
+
+    speech_recognizer, recognized_text = create_transcription_recognizer(pcm, target_language)
+    run_continuous_recognition(speech_recognizer, get_recognition_timeout(pcm))
+    return {"transcription": " ".join(recognized_text)}
+
+
+def assess_pronunciation(pcm, reference_text, target_language, reference_words=None, details=False, offset=0.0):
+    speech_recognizer, results = create_pronunciation_recognizer(pcm, reference_text, target_language)
+    run_continuous_recognition(speech_recognizer, get_recognition_timeout(pcm))
+    return score_pronunciation(
+        results, reference_text, target_language, reference_words=reference_words, include_words=details,
+        offset=offset,
+    )
+
+
+JOB_RUNNERS = {
+    Job.KIND_TRANSCRIPTION: transcribe,
+    Job.KIND_PRONUNCIATION: assess_pronunciation,
+}
+
+
+def purge_expired_jobs():
+    """
+    Fail orphaned jobs and delete jobs past the retention period; runs at most
+    once a minute per worker.
+    """
+    global _last_purge
+
+    now = time.monotonic()
+    if now - _last_purge < 60:
+        return
+    _last_purge = now
+
+    fail_stale_jobs()
+
+    # Running jobs are left to fail_stale_jobs(): deleting one would lose its result.
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_RETENTION)
+    expired = Job.objects.filter(created_at__lt=cutoff).exclude(status=Job.STATUS_RUNNING)
+    for job in expired:
+        _delete_audio(job)
+    expired.delete()
+
+
+def fail_stale_jobs():
+    """
+    Mark running jobs failed once they are JOB_STALE_AFTER seconds past their
+    recognition timeout: a live run would have ended by then, so the worker
+    running them went away.
+    """
+    now = timezone.now()
+    for job in Job.objects.filter(status=Job.STATUS_RUNNING):
+        budget = settings.SPEECH_RECOGNITION_TIMEOUT + job.audio_duration + settings.JOB_STALE_AFTER
+        if job.started_at + timedelta(seconds=budget) > now:
+            continue
+        failed = Job.objects.filter(pk=job.pk, status=Job.STATUS_RUNNING).update(
+            status=Job.STATUS_FAILED, error="The worker running this job stopped.", finished_at=now
+        )
+        if failed:
+            logger.warning(f"Job {job.pk} was orphaned by its worker and marked failed.")
+            _delete_audio(job)
+
+
+def recover_jobs(**kwargs):
+    """
+    request_started receiver: on a worker's first request, fail stale running
+    jobs and queue the pending ones here. A pending job may still be queued in
+    a live worker too; whichever reaches it first claims it in run_job().
+    """
+    global _recovered_pid
+
+    pid = os.getpid()
+    with _queues_lock:
+        if _recovered_pid == pid:
+            return
+        _recovered_pid = pid
+
+    try:
+        _recover_jobs()
+    except DatabaseError as e:
+        # Must not fail the request that triggered it, e.g. before the first migrate.
+        logger.error(f"Could not recover jobs: {e}", exc_info=True)
+
+
+def _recover_jobs():
+    fail_stale_jobs()
+    full = set()
+    for job in Job.objects.filter(status=Job.STATUS_PENDING).order_by("created_at"):
+        if job.queue in full:
+            continue
+        if not os.path.exists(job.audio_path):
+            Job.objects.filter(pk=job.pk, status=Job.STATUS_PENDING).update(
+                status=Job.STATUS_FAILED, error="The job's audio was lost.", finished_at=timezone.now()
+            )
+            continue
+        try:
+            get_queue(job.queue).submit(job)
+        except QueueFull:
+            # Left pending for another worker, or for this one's next restart.
+            full.add(job.queue)
+
+
+def _delete_audio(job):
+    try:
+        os.remove(job.audio_path)
+    except OSError:
+        pass
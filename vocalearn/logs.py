@@ -0,0 +1,104 @@
+"""
+Structured, non-blocking logging for code that runs on latency-sensitive
+threads, such as the Speech SDK's event callbacks.
+
+NonBlockingHandler only puts records on a bounded queue; a listener thread
+formats and writes them. When the queue is full the record is dropped and
+counted in the vocalearn_log_records_dropped_total metric rather than making
+the caller wait on the log driver.
+"""
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import uuid
+from datetime import datetime, timezone
+
+from . import metrics
+
+# ID of the request being handled, set by middleware.RequestIdMiddleware.
+request_id = contextvars.ContextVar("request_id", default=None)
+
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+def new_request_id():
+    return uuid.uuid4().hex
+
+
+class RequestIdFilter(logging.Filter):
+    """Tag records with the current request's ID unless the caller already passed one."""
+
+    def filter(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message and every ``extra`` field."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class NonBlockingHandler(logging.handlers.QueueHandler):
+    """
+    Queue in front of a StreamHandler writing to stderr. The listener thread is
+    started lazily and again after a fork, since threads do not survive one;
+    logging.shutdown() closes the handler, which drains the queue.
+    """
+
+    def __init__(self, max_queued=10000):
+        super().__init__(queue.Queue(max_queued))
+        self.target = logging.StreamHandler()
+        self._listener = None
+        self._listener_pid = None
+        self._start_lock = threading.Lock()
+
+    def setFormatter(self, fmt):
+        # Formatting happens on the listener thread, off the caller's.
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Merge the args now; formatting, and with it the extra fields, is left to the listener.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.log_records_dropped.inc(logger=record.name)
+
+    def _ensure_listener(self):
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return
+        with self._start_lock:
+            if self._listener_pid != pid:
+                self._listener = logging.handlers.QueueListener(self.queue, self.target, respect_handler_level=True)
+                self._listener.start()
+                self._listener_pid = pid
+
+    def close(self):
+        if self._listener is not None and self._listener_pid == os.getpid():
+            self._listener.stop()
+            self._listener_pid = None
+        super().close()
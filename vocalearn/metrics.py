@@ -0,0 +1,204 @@
+"""
+Request and stage latency metrics, exposed in the Prometheus text format.
+
+Code that does a distinct piece of work for a request (decoding, recognition,
+a Translator call, ...) wraps it in ``stage(name)``. The duration goes into the
+stage histogram and, when a request is being timed (see
+middleware.MetricsMiddleware), into that request's ``Server-Timing`` header.
+
+Metrics live in this process, like the caches and pools: each gunicorn worker
+reports its own series, so scrape every worker or sum them in the query.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _format_labels(self, key, extra=()):
+        pairs = [*zip(self.labelnames, key), *extra]
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.extend(self._samples(key, value))
+        return lines
+
+    def _samples(self, key, value):
+        return [f"{self.name}{self._format_labels(key)} {_format_value(value)}"]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=None):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = sorted(buckets if buckets is not None else settings.METRICS["BUCKETS"])
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (plus +Inf), made cumulative at render time; then sum.
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def _samples(self, key, state):
+        counts, total = state
+        lines = []
+        cumulative = 0
+        for bound, count in zip([*self.buckets, float("inf")], counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else _format_value(bound)
+            lines.append(f"{self.name}_bucket{self._format_labels(key, [('le', le)])} {cumulative}")
+        lines.append(f"{self.name}_sum{self._format_labels(key)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{self._format_labels(key)} {cumulative}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+request_duration = Histogram(
+    "vocalearn_request_duration_seconds", "Time to produce a response, by view.", ["view", "method"],
+)
+requests_total = Counter(
+    "vocalearn_requests_total", "Responses sent, by view and status code.", ["view", "method", "status"],
+)
+requests_in_flight = Gauge(
+    "vocalearn_requests_in_flight", "Requests currently being handled, by view.", ["view"],
+)
+stage_duration = Histogram(
+    "vocalearn_stage_duration_seconds",
+    "Time spent in each stage of request handling (upload, decode, recognition, translator, ...).", ["stage"],
+)
+upstream_errors = Counter(
+    "vocalearn_upstream_errors_total", "Failed calls to Azure, by service and reason.", ["service", "reason"],
+)
+admission_rejections = Counter(
+    "vocalearn_admission_rejections_total", "Requests turned away by admission control, by scope and reason.",
+    ["scope", "reason"],
+)
+admission_waiting = Gauge(
+    "vocalearn_admission_waiting", "Requests waiting for a global concurrency slot, by scope.", ["scope"],
+)
+
+upstream_hedges = Counter(
+    "vocalearn_upstream_hedges_total", "Duplicate calls sent because the first was slow, by service.", ["service"],
+)
+circuit_open = Gauge(
+    "vocalearn_circuit_open", "1 while the circuit breaker of an upstream target is open.", ["service", "target"],
+)
+log_records_dropped = Counter(
+    "vocalearn_log_records_dropped_total", "Log records dropped because the log queue was full, by logger.",
+    ["logger"],
+)
+
+registry = [request_duration, requests_total, requests_in_flight, stage_duration, upstream_errors,
+            admission_rejections, admission_waiting, upstream_hedges, circuit_open, log_records_dropped]
+
+
+def render():
+    return "\n".join(line for metric in registry for line in metric.render()) + "\n"
+
+
+class RequestTimings:
+    """Stage durations of one request. Stages run on several threads (split or batch clips) add up."""
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def server_timing(self, total):
+        with self._lock:
+            stages = list(self.stages.items())
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in [*stages, ("total", total)])
+
+
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def start_request():
+    timings = RequestTimings()
+    return timings, _request_timings.set(timings)
+
+
+def end_request(token):
+    _request_timings.reset(token)
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        stage_duration.observe(seconds, stage=name)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.add(name, seconds)
+
+
+def submit(executor, func, *args, **kwargs):
+    """``executor.submit`` that keeps the caller's request timings, so stages on the pool's threads are counted."""
+    return executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
@@ -0,0 +1,115 @@
+import re
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+from . import logs, metrics
+
+# Accept an upstream proxy's request ID only if it is a plausible one.
+REQUEST_ID = re.compile(r"[A-Za-z0-9._-]{1,64}")
+
+
+class RequestIdMiddleware:
+    """
+    Give every request an ID, taken from the ``X-Request-ID`` header when a proxy
+    set one, for the logs written while handling it; echoed in the response.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        token = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            logs.request_id.reset(token)
+        response["X-Request-ID"] = request.request_id
+        return response
+
+    async def __acall__(self, request):
+        token = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            logs.request_id.reset(token)
+        response["X-Request-ID"] = request.request_id
+        return response
+
+    def _start(self, request):
+        request_id = request.headers.get("X-Request-ID", "")
+        request.request_id = request_id if REQUEST_ID.fullmatch(request_id) else logs.new_request_id()
+        return logs.request_id.set(request.request_id)
+
+
+class MetricsMiddleware:
+    """
+    Time every request: counts it in the in-flight gauge while it is handled,
+    records its duration and status, and reports the stages it went through in
+    a ``Server-Timing`` header. Streaming responses are timed up to the first
+    byte; stages that run while their body is produced only reach the histograms.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        view, timings, token, start = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+            metrics.requests_in_flight.dec(view=view)
+        return self._finish(request, response, view, timings, start)
+
+    async def __acall__(self, request):
+        view, timings, token, start = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+            metrics.requests_in_flight.dec(view=view)
+        return self._finish(request, response, view, timings, start)
+
+    def _start(self, request):
+        view = view_name(request.path_info)
+        metrics.requests_in_flight.inc(view=view)
+        timings, token = metrics.start_request()
+        return view, timings, token, time.perf_counter()
+
+    def _finish(self, request, response, view, timings, start):
+        total = time.perf_counter() - start
+        metrics.request_duration.observe(total, view=view, method=request.method)
+        metrics.requests_total.inc(view=view, method=request.method, status=response.status_code)
+        if settings.METRICS["SERVER_TIMING"]:
+            response["Server-Timing"] = timings.server_timing(total)
+        return response
+
+
+def view_name(path):
+    # URL names rather than paths, so IDs in the URL do not create a series per object.
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return "unmatched"
+    return match.view_name
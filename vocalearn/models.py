@@ -1,3 +1,71 @@
+import uuid
+
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+from .segmentation import tokenize_reference
+
+
+class Job(models.Model):
+    KIND_TRANSCRIPTION = 'transcription'
+    KIND_PRONUNCIATION = 'pronunciation'
+    KIND_CHOICES = [
+        (KIND_TRANSCRIPTION, 'Transcription'),
+        (KIND_PRONUNCIATION, 'Pronunciation assessment'),
+    ]
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='jobs')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    queue = models.CharField(max_length=50)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    params = models.JSONField(default=dict)
+    audio_path = models.CharField(max_length=255)
+    audio_duration = models.FloatField(default=0)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['queue', 'status'])]
+
+    def __str__(self):
+        return f'{self.kind} job {self.id} ({self.status})'
+
+
+class Passage(models.Model):
+    """Reading passage registered once, with its reference tokens precomputed for assessments."""
+
+    title = models.CharField(max_length=255, blank=True)
+    language = models.CharField(max_length=20)
+    text = models.TextField()
+    tokens = models.JSONField(default=list, editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='passages')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def save(self, *args, **kwargs):
+        self.tokens = tokenize_reference(self.text, self.language)
+        self.word_count = len(self.tokens)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.title or f'Passage {self.pk}'
@@ -0,0 +1,45 @@
+import azure.cognitiveservices.speech as speechsdk
+
+from . import metrics, scoring, segmentation
+from .audio import get_audio_config
+from .recognition import log_session_events
+from .speech_pool import get_pronunciation_config, get_speech_config
+
+
+def create_pronunciation_recognizer(pcm, reference_text, target_language, enable_miscue=True, enable_prosody_assessment=True):
+    with metrics.stage("recognizer_setup"):
+        pronunciation_config = get_pronunciation_config(
+            reference_text,
+            granularity=speechsdk.PronunciationAssessmentGranularity.Phoneme,
+            enable_prosody_assessment=enable_prosody_assessment,
+            enable_miscue=enable_miscue)
+
+        speech_recognizer = speechsdk.SpeechRecognizer(
+            speech_config=get_speech_config(target_language), audio_config=get_audio_config(pcm)
+        )
+        pronunciation_config.apply_to(speech_recognizer)
+
+    results = scoring.AssessmentRecords()
+    speech_recognizer.recognized.connect(lambda evt: results.add_segment(
+        evt.result.properties.get(speechsdk.PropertyId.SpeechServiceResponse_JsonResult)
+    ))
+    log_session_events(speech_recognizer, target_language, pcm)
+
+    return speech_recognizer, results
+
+
+def score_pronunciation(results, reference_text, target_language, enable_miscue=True, reference_words=None,
+                        include_words=False, offset=0.0):
+    """
+    Aggregate the recognizer's results into the four scores (see scoring.aggregate).
+    ``reference_words`` skips tokenizing ``reference_text`` when it was done ahead
+    of time (see Passage); ``include_words`` adds per-word results, with ``offset``
+    seconds (silence trimmed off the start) added to their offsets.
+    """
+    with metrics.stage("scoring"):
+        # Chinese segmentation is steered by the recognized words, so it is redone even for a
+        # passage, to score it the same as the raw text; its unsteered segmentation is cached.
+        if reference_words is None or target_language == 'zh-CN':
+            reference_words = segmentation.tokenize_reference(reference_text, target_language, results.words)
+
+        return scoring.aggregate(results, reference_words, enable_miscue, include_words, offset)
@@ -0,0 +1,240 @@
+import asyncio
+import itertools
+import logging
+import threading
+
+from django.conf import settings
+
+import azure.cognitiveservices.speech as speechsdk
+
+from . import logs, metrics
+from .audio import get_audio_config, get_duration
+from .executor import get_recognition_executor, run_in_executor
+from .silence import split_on_silence
+from .speech_pool import get_region, get_speech_config
+
+event_logger = logging.getLogger("vocalearn.speech")
+
+# Cancellation codes that mean the region is in trouble, as opposed to e.g. a bad key or request.
+SERVICE_ERRORS = {"ConnectionFailure", "ServiceTimeout", "ServiceError", "ServiceUnavailable", "TooManyRequests"}
+
+
+class RecognitionTimeout(Exception):
+    pass
+
+
+class RecognitionFailed(Exception):
+    pass
+
+
+def create_transcription_recognizer(pcm, target_language):
+    """Build a continuous recognizer for ``pcm`` and the list its final segments are collected into."""
+    with metrics.stage("recognizer_setup"):
+        speech_recognizer = speechsdk.SpeechRecognizer(
+            speech_config=get_speech_config(target_language),
+            audio_config=get_audio_config(pcm),
+        )
+
+    recognized_text = []
+    speech_recognizer.recognized.connect(lambda evt: recognized_text.append(evt.result.text))
+    log_session_events(speech_recognizer, target_language, pcm)
+
+    return speech_recognizer, recognized_text
+
+
+def log_session_events(recognizer, target_language, pcm):
+    """
+    Log the recognizer's session events to the ``vocalearn.speech`` logger (see
+    LOGGING). The callbacks run on SDK threads, so the request's fields are
+    captured here. Interim hypotheses are logged at DEBUG, and only one in
+    SPEECH_EVENT_LOGGING['INTERIM_EVERY'].
+    """
+    fields = {"request_id": logs.request_id.get(), "language": target_language,
+              "audio_duration": round(get_duration(pcm), 3)}
+
+    def log(level, message, evt, **extra):
+        event_logger.log(level, message, extra={**fields, "session_id": evt.session_id, **extra})
+
+    def canceled(evt):
+        details = evt.cancellation_details
+        if details.reason == speechsdk.CancellationReason.Error:
+            log(logging.WARNING, "Recognition canceled", evt, reason=details.reason.name,
+                error_code=details.code.name, error_details=details.error_details)
+        else:
+            log(logging.INFO, "Recognition canceled", evt, reason=details.reason.name)
+
+    recognizer.session_started.connect(lambda evt: log(logging.INFO, "Session started", evt))
+    recognizer.session_stopped.connect(lambda evt: log(logging.INFO, "Session stopped", evt))
+    recognizer.canceled.connect(canceled)
+
+    # Checked once per session: with interim events disabled the callback is never connected.
+    if event_logger.isEnabledFor(logging.DEBUG):
+        every = settings.SPEECH_EVENT_LOGGING["INTERIM_EVERY"]
+        counter = itertools.count()
+
+        def recognizing(evt):
+            if next(counter) % every == 0:
+                log(logging.DEBUG, "Recognizing", evt, text=evt.result.text)
+
+        recognizer.recognizing.connect(recognizing)
+
+
+def get_recognition_timeout(pcm):
+    # Continuous recognition runs at roughly real time, so long clips get a proportionally longer budget.
+    return settings.SPEECH_RECOGNITION_TIMEOUT + get_duration(pcm)
+
+
+class SessionOutcome:
+    """
+    Watches a recognizer session for errors and reports how it ended to the
+    circuit breaker of the recognizer's region.
+    """
+
+    def __init__(self, recognizer):
+        self.region = get_region(
+            recognizer.properties.get_property(speechsdk.PropertyId.SpeechServiceConnection_Region)
+        )
+        self.error = None
+        recognizer.canceled.connect(self._canceled)
+
+    def _canceled(self, evt):
+        # The SDK also cancels with EndOfStream once a push stream is drained; only errors are failures.
+        details = evt.cancellation_details
+        if details.reason == speechsdk.CancellationReason.Error:
+            self.error = details
+
+    def timed_out(self, timeout):
+        self.region.breaker.record_failure()
+        metrics.upstream_errors.inc(service="speech", reason="timeout")
+        return RecognitionTimeout(f"Speech recognition did not finish within {timeout:.0f} seconds.")
+
+    def finish(self):
+        """Raise RecognitionFailed if the session was canceled by an error."""
+        if self.error is None:
+            self.region.breaker.record_success()
+            return
+
+        code = self.error.code.name
+        metrics.upstream_errors.inc(service="speech", reason=code)
+        if code in SERVICE_ERRORS:
+            self.region.breaker.record_failure()
+        raise RecognitionFailed(f"Speech recognition failed: {self.error.error_details}")
+
+
+def run_continuous_recognition(recognizer, timeout):
+    """
+    Run continuous recognition until the session stops or is canceled.
+
+    Completion is signalled by the SDK callbacks, so the call returns as soon as
+    the last result arrives. If that does not happen within ``timeout`` seconds
+    the recognizer is stopped and RecognitionTimeout is raised; RecognitionFailed
+    is raised when the service canceled the session with an error.
+    """
+    outcome = SessionOutcome(recognizer)
+    done = threading.Event()
+    recognizer.session_stopped.connect(lambda evt: done.set())
+    recognizer.canceled.connect(lambda evt: done.set())
+
+    with metrics.stage("recognition"):
+        recognizer.start_continuous_recognition()
+        try:
+            finished = done.wait(timeout)
+        finally:
+            recognizer.stop_continuous_recognition()
+
+    if not finished:
+        raise outcome.timed_out(timeout)
+    outcome.finish()
+
+
+def transcribe_chunk(pcm, target_language):
+    speech_recognizer, recognized_text = create_transcription_recognizer(pcm, target_language)
+    run_continuous_recognition(speech_recognizer, get_recognition_timeout(pcm))
+    return " ".join(recognized_text)
+
+
+def transcribe_split(pcm, target_language, offset=0.0):
+    """
+    Transcribe ``pcm`` as chunks split at pauses, recognized concurrently on the
+    recognition executor (at most SPEECH_SPLITTING['MAX_SESSIONS'] sessions per
+    worker). Returns the stitched transcription plus each chunk's text and offset;
+    ``offset`` seconds (silence trimmed off the start) are added to the offsets.
+    """
+    chunks = split_on_silence(pcm)
+    executor = get_recognition_executor()
+    futures = [metrics.submit(executor, transcribe_chunk, chunk, target_language) for _, chunk in chunks]
+
+    segments = []
+    try:
+        for (start, chunk), future in zip(chunks, futures):
+            segments.append({"offset": round(offset + start, 3), "duration": round(get_duration(chunk), 3),
+                             "text": future.result()})
+    finally:
+        for future in futures:
+            future.cancel()
+
+    return {"transcription": " ".join(s["text"] for s in segments if s["text"]), "segments": segments}
+
+
+async def run_continuous_recognition_async(recognizer, timeout):
+    """
+    Async counterpart of run_continuous_recognition. The SDK callbacks resolve a
+    future on the event loop, so no thread is held while Azure is recognizing;
+    only the short start/stop calls go through the executor.
+    """
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+
+    def finish(evt):
+        loop.call_soon_threadsafe(lambda: done.done() or done.set_result(None))
+
+    outcome = SessionOutcome(recognizer)
+    recognizer.session_stopped.connect(finish)
+    recognizer.canceled.connect(finish)
+
+    with metrics.stage("recognition"):
+        await run_in_executor(recognizer.start_continuous_recognition)
+        try:
+            await asyncio.wait_for(done, timeout)
+        except asyncio.TimeoutError:
+            raise outcome.timed_out(timeout)
+        finally:
+            await run_in_executor(recognizer.stop_continuous_recognition)
+    outcome.finish()
+
+
+async def stream_continuous_recognition(recognizer, timeout):
+    """
+    Run continuous recognition and yield ``(event, text)`` pairs as the SDK
+    reports them: 'recognizing' for interim hypotheses and 'recognized' for final
+    segments. Ends when the session stops or is canceled; raises
+    RecognitionTimeout if that has not happened within ``timeout`` seconds, and
+    RecognitionFailed once the events are exhausted if an error canceled it.
+    """
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+
+    def put(item):
+        loop.call_soon_threadsafe(events.put_nowait, item)
+
+    recognizer.recognizing.connect(lambda evt: put(("recognizing", evt.result.text)))
+    recognizer.recognized.connect(lambda evt: evt.result.text and put(("recognized", evt.result.text)))
+    outcome = SessionOutcome(recognizer)
+    recognizer.session_stopped.connect(lambda evt: put(None))
+    recognizer.canceled.connect(lambda evt: put(None))
+
+    deadline = loop.time() + timeout
+    with metrics.stage("recognition"):
+        await run_in_executor(recognizer.start_continuous_recognition)
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(events.get(), max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    raise outcome.timed_out(timeout)
+                if item is None:
+                    break
+                yield item
+        finally:
+            await run_in_executor(recognizer.stop_continuous_recognition)
+    outcome.finish()
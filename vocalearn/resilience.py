@@ -0,0 +1,244 @@
+"""
+Circuit breaking, failover and hedging for calls to Azure.
+
+Every upstream target (a Translator endpoint, a Speech region) is an Upstream
+with its own circuit breaker. After FAILURE_THRESHOLD consecutive failures the
+circuit opens and the target is skipped in favour of the next one configured;
+after RESET_TIMEOUT seconds a single probe request is let through, and its
+outcome closes or re-opens the circuit. With every target open, callers fail
+fast with CircuitOpen instead of waiting for a timeout.
+
+call() and call_async() also hedge idempotent calls: if an attempt has not
+returned after the target's hedge delay (a high quantile of its recent
+latencies), a duplicate goes to the next target, or to the same one when there
+is no other, and the first success wins.
+
+Like the caches and pools, breakers and latencies are per worker.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from django.conf import settings
+
+from . import metrics
+from .executor import get_hedge_executor
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class UpstreamFailure(Exception):
+    """
+    An attempt failed in a way another attempt could succeed at: a timeout, a
+    connection error, or a 429/5xx ``response``.
+    """
+
+    def __init__(self, reason, details=None, response=None):
+        super().__init__(f"Upstream call failed: {reason}")
+        self.reason = reason
+        self.details = details
+        self.response = response
+
+
+def get_config():
+    return settings.UPSTREAM_RESILIENCE
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, service, name):
+        self.service = service
+        self.name = name
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go to this target now. Claims the probe when the circuit is half open."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            # A probe whose outcome never came back (e.g. the request died) is retried after another period.
+            if time.monotonic() - self.opened_at < get_config()["RESET_TIMEOUT"]:
+                return False
+            self.state = self.HALF_OPEN
+            self.opened_at = time.monotonic()
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            if self.state != self.CLOSED:
+                self.state = self.CLOSED
+                metrics.circuit_open.set(0, service=self.service, target=self.name)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= get_config()["FAILURE_THRESHOLD"]:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                metrics.circuit_open.set(1, service=self.service, target=self.name)
+
+
+class Upstream:
+    """One target of a ``service``; ``attributes`` (url, key, region, ...) are for the caller's use."""
+
+    def __init__(self, service, name, **attributes):
+        self.service = service
+        self.name = name
+        self.__dict__.update(attributes)
+        self.breaker = CircuitBreaker(service, name)
+        self.latencies = deque(maxlen=get_config()["LATENCY_WINDOW"])
+
+    def hedge_delay(self):
+        config = get_config()
+        latencies = sorted(self.latencies)
+        if len(latencies) < config["HEDGE_MIN_SAMPLES"]:
+            return config["HEDGE_DEFAULT_DELAY"]
+        index = min(int(len(latencies) * config["HEDGE_QUANTILE"]), len(latencies) - 1)
+        return max(latencies[index], config["HEDGE_MIN_DELAY"])
+
+
+def next_available(upstreams):
+    """The next upstream from the iterator ``upstreams`` whose circuit lets a call through, or None."""
+    for upstream in upstreams:
+        if upstream.breaker.allow():
+            return upstream
+    return None
+
+
+def first_available(upstreams):
+    upstream = next_available(iter(upstreams))
+    if upstream is None:
+        raise CircuitOpen("No upstream target is available.")
+    return upstream
+
+
+def _record(upstream, start, failure=None):
+    if failure is None:
+        upstream.latencies.append(time.perf_counter() - start)
+        upstream.breaker.record_success()
+    else:
+        upstream.breaker.record_failure()
+        metrics.upstream_errors.inc(service=upstream.service, reason=failure.reason)
+
+
+def _attempt(upstream, send):
+    start = time.perf_counter()
+    try:
+        result = send(upstream)
+    except UpstreamFailure as e:
+        _record(upstream, start, e)
+        raise
+    _record(upstream, start)
+    return result
+
+
+async def _attempt_async(upstream, send):
+    start = time.perf_counter()
+    try:
+        result = await send(upstream)
+    except UpstreamFailure as e:
+        _record(upstream, start, e)
+        raise
+    _record(upstream, start)
+    return result
+
+
+def call(upstreams, send, hedge=False):
+    """
+    Return ``send(upstream)`` from the first upstream whose circuit is closed,
+    failing over to the next one when it raises UpstreamFailure; raises the last
+    failure when every target failed, or CircuitOpen when none could be tried.
+    Only hedge calls that are safe to send twice.
+    """
+    candidates = iter(upstreams)
+    first = next_available(candidates)
+    if first is None:
+        raise CircuitOpen("No upstream target is available.")
+
+    if not hedge or not get_config()["HEDGE"]:
+        upstream = first
+        while True:
+            try:
+                return _attempt(upstream, send)
+            except UpstreamFailure:
+                upstream = next_available(candidates)
+                if upstream is None:
+                    raise
+
+    executor = get_hedge_executor()
+    primary = first
+    in_flight = {metrics.submit(executor, _attempt, primary, send): primary}
+    hedged = False
+    failure = None
+    while in_flight:
+        done, _ = wait(in_flight, timeout=None if hedged else primary.hedge_delay(), return_when=FIRST_COMPLETED)
+        if not done:
+            hedged = True
+            metrics.upstream_hedges.inc(service=primary.service)
+            target = next_available(candidates) or primary
+            in_flight[metrics.submit(executor, _attempt, target, send)] = target
+            continue
+
+        for future in done:
+            del in_flight[future]
+            try:
+                # The losing attempt, if any, finishes in the background and only feeds the breaker.
+                return future.result()
+            except UpstreamFailure as e:
+                failure = e
+
+        if not in_flight:
+            primary = next_available(candidates)
+            if primary is not None:
+                in_flight[metrics.submit(executor, _attempt, primary, send)] = primary
+    raise failure
+
+
+async def call_async(upstreams, send, hedge=False):
+    """Async counterpart of call(); ``send`` is a coroutine function, and a losing attempt is cancelled."""
+    candidates = iter(upstreams)
+    first = next_available(candidates)
+    if first is None:
+        raise CircuitOpen("No upstream target is available.")
+
+    hedged = not hedge or not get_config()["HEDGE"]
+    primary = first
+    in_flight = {asyncio.ensure_future(_attempt_async(primary, send))}
+    failure = None
+    try:
+        while in_flight:
+            done, in_flight = await asyncio.wait(
+                in_flight, timeout=None if hedged else primary.hedge_delay(), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                hedged = True
+                metrics.upstream_hedges.inc(service=primary.service)
+                target = next_available(candidates) or primary
+                in_flight.add(asyncio.ensure_future(_attempt_async(target, send)))
+                continue
+
+            for task in done:
+                try:
+                    return task.result()
+                except UpstreamFailure as e:
+                    failure = e
+
+            if not in_flight:
+                primary = next_available(candidates)
+                if primary is not None:
+                    in_flight.add(asyncio.ensure_future(_attempt_async(primary, send)))
+        raise failure
+    finally:
+        for task in in_flight:
+            task.cancel()
@@ -0,0 +1,165 @@
+"""
+Aggregation of pronunciation assessment results into the scores the API returns.
+
+Each recognized segment's JSON is parsed once into compact NumPy arrays, one
+entry per word (accuracy, offset, duration, error type), and the aggregates are
+computed over the concatenated arrays rather than by looping over SDK word
+objects. Kept free of SDK imports so it can be exercised with plain JSON.
+"""
+import json
+
+import numpy as np
+
+from . import alignment, metrics
+
+ERROR_TYPES = ["None", "Omission", "Insertion", "Mispronunciation", "UnexpectedBreak", "MissingBreak", "Monotone",
+               "Other"]
+ERROR_CODES = {name: code for code, name in enumerate(ERROR_TYPES)}
+NONE, OMISSION, INSERTION, OTHER = (ERROR_CODES[name] for name in ("None", "Omission", "Insertion", "Other"))
+
+# Offsets and durations in the service's JSON are in 100 ns ticks.
+TICKS_PER_SECOND = 10_000_000
+
+
+class AssessmentRecords:
+    """Word-level and segment-level results of one assessment, accumulated segment by segment."""
+
+    def __init__(self):
+        self.words = []
+        self._segments = []
+        self._arrays = None
+        self.fluency_scores = []
+        self.prosody_scores = []
+        self.durations = []
+
+    def add_segment(self, json_result):
+        """Record one recognized segment from its SpeechServiceResponse_JsonResult."""
+        if not json_result:
+            return
+        nbest = json.loads(json_result).get("NBest")
+        if not nbest:
+            return
+
+        best = nbest[0]
+        words = best.get("Words", [])
+        assessments = [w.get("PronunciationAssessment", {}) for w in words]
+        count = len(words)
+
+        self.words += [w["Word"] for w in words]
+        self._segments.append((
+            np.fromiter((a.get("AccuracyScore", 0) for a in assessments), np.float64, count),
+            np.fromiter((w.get("Offset", 0) for w in words), np.int64, count),
+            np.fromiter((w.get("Duration", 0) for w in words), np.int64, count),
+            np.fromiter((ERROR_CODES.get(a.get("ErrorType", "None"), OTHER) for a in assessments), np.int8, count),
+        ))
+        self._arrays = None
+
+        segment = best.get("PronunciationAssessment", {})
+        self.fluency_scores.append(segment.get("FluencyScore", 0))
+        if segment.get("ProsodyScore") is not None:
+            self.prosody_scores.append(segment["ProsodyScore"])
+        self.durations.append(int(self._segments[-1][2].sum()))
+
+    def arrays(self):
+        """``(accuracy, offset, duration, error)`` arrays over every recognized word."""
+        if self._arrays is None:
+            if self._segments:
+                self._arrays = tuple(np.concatenate(column) for column in zip(*self._segments))
+            else:
+                self._arrays = (np.zeros(0, np.float64), np.zeros(0, np.int64), np.zeros(0, np.int64),
+                                np.zeros(0, np.int8))
+        return self._arrays
+
+
+def aggregate(records, reference_words, enable_miscue=True, include_words=False, offset=0.0):
+    """
+    Compute accuracy, prosody, completeness and fluency for ``records`` against
+    ``reference_words``. With ``enable_miscue`` the recognized words are aligned
+    to the reference: extra words count as insertions (excluded from accuracy)
+    and missing ones as omissions (scored 0). Empty inputs score 0 instead of
+    dividing by zero; ``prosodyScore`` stays "nan" when prosody was not assessed.
+    Word offsets are shifted by ``offset`` seconds.
+    """
+    accuracy, offsets, durations, errors = records.arrays()
+    opcodes = None
+    omitted = 0
+
+    if enable_miscue:
+        with metrics.stage("alignment"):
+            opcodes = alignment.align(reference_words, records.words)
+        inserted = np.zeros(len(errors), dtype=bool)
+        for tag, i1, i2, j1, j2 in opcodes:
+            if tag in ("insert", "replace"):
+                inserted[j1:j2] = True
+            if tag in ("delete", "replace"):
+                omitted += i2 - i1
+        errors = np.where(inserted & (errors == NONE), INSERTION, errors)
+
+    scored = errors != INSERTION
+    scored_count = int(np.count_nonzero(scored)) + omitted
+    accuracy_score = float(accuracy[scored].sum()) / scored_count if scored_count else 0.0
+
+    prosody_score = float(np.mean(records.prosody_scores)) if records.prosody_scores else "nan"
+
+    fluency = np.asarray(records.fluency_scores, dtype=np.float64)
+    weights = np.asarray(records.durations, dtype=np.float64)
+    if weights.sum() > 0:
+        fluency_score = float(np.dot(fluency, weights) / weights.sum())
+    else:
+        fluency_score = float(fluency.mean()) if len(fluency) else 0.0
+
+    if reference_words:
+        completeness_score = min(np.count_nonzero(errors == NONE) / len(reference_words) * 100, 100.0)
+    else:
+        completeness_score = 0.0
+
+    scores = {"accuracyScore": accuracy_score, "prosodyScore": prosody_score,
+              "completenessScore": float(completeness_score), "fluency_score": fluency_score}
+    if include_words:
+        scores["words"] = word_details(records.words, reference_words, accuracy, offsets, durations, errors, opcodes,
+                                       offset)
+    return scores
+
+
+def word_details(words, reference_words, accuracy, offsets, durations, errors, opcodes=None, offset=0.0):
+    """Per-word results in reading order, with omitted reference words in place."""
+    # Rounded to the tick, so that adding ``offset`` does not show float noise.
+    accuracy, offsets, durations, errors = (
+        accuracy.tolist(), np.round(offsets / TICKS_PER_SECOND + offset, 7).tolist(),
+        (durations / TICKS_PER_SECOND).tolist(),
+        errors.tolist(),
+    )
+
+    def recognized(j):
+        return {"word": words[j], "accuracyScore": accuracy[j], "errorType": ERROR_TYPES[errors[j]],
+                "offset": offsets[j], "duration": durations[j]}
+
+    def omitted(i):
+        return {"word": reference_words[i], "accuracyScore": 0, "errorType": "Omission",
+                "offset": None, "duration": None}
+
+    if opcodes is None:
+        return [recognized(j) for j in range(len(words))]
+
+    details = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag != "delete":
+            details += [recognized(j) for j in range(j1, j2)]
+        if tag in ("delete", "replace"):
+            details += [omitted(i) for i in range(i1, i2)]
+    return details
+
+
+SCORE_FIELDS = ("accuracyScore", "prosodyScore", "completenessScore", "fluency_score")
+
+
+def aggregate_lesson(results):
+    """
+    Mean of each score over the assessed clips of a lesson. Prosody is averaged
+    over the clips where it was assessed; a score with no values is None.
+    """
+    lesson = {}
+    for field in SCORE_FIELDS:
+        values = np.array([r[field] for r in results if not isinstance(r[field], str)], dtype=np.float64)
+        lesson[field] = float(values.mean()) if len(values) else None
+    return lesson
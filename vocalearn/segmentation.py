@@ -0,0 +1,123 @@
+import logging
+import string
+import threading
+from collections import ChainMap
+from functools import lru_cache
+
+from django.conf import settings
+
+import jieba
+import zhon.hanzi
+
+jieba.setLogLevel(logging.INFO)
+
+# Private tokenizer so nothing else in the process can mutate our dictionary.
+tokenizer = jieba.Tokenizer()
+_initialize_lock = threading.Lock()
+
+
+def get_tokenizer():
+    if not tokenizer.initialized:
+        with _initialize_lock:
+            tokenizer.initialize()
+    return tokenizer
+
+
+class OverlayTokenizer(jieba.Tokenizer):
+    """
+    Tokenizer that sees a handful of frequency adjustments on top of the shared
+    dictionary. The base dictionary is never modified, so per-request words stay
+    per-request.
+    """
+
+    def __init__(self, base, joins, splits):
+        self.__dict__.update(base.__dict__)
+        overlay = {}
+        for word in joins:
+            overlay[word] = max(base.FREQ.get(word) or 0, _joined_freq(base, word))
+            # jieba stores every prefix of a word with frequency 0 to build its DAG.
+            for end in range(1, len(word)):
+                overlay.setdefault(word[:end], base.FREQ.get(word[:end], 0))
+        for word, parts in splits:
+            overlay[word] = min(base.FREQ.get(word, 0), _split_freq(base, parts))
+        self.FREQ = ChainMap(overlay, base.FREQ)
+
+
+# Same computations as jieba.suggest_freq(..., tune=True), without writing the result back.
+
+def _joined_freq(base, word):
+    total = float(base.total)
+    freq = 1
+    for segment in base.cut(word, HMM=False):
+        freq *= base.FREQ.get(segment, 1) / total
+    return int(freq * total) + 1
+
+
+def _split_freq(base, parts):
+    total = float(base.total)
+    freq = 1
+    for part in parts:
+        freq *= base.FREQ.get(part, 1) / total
+    return int(freq * total)
+
+
+def _decompose(word, vocabulary):
+    """Split ``word`` into two or more words from ``vocabulary``, or return None."""
+    best = {0: ()}
+    for end in range(1, len(word) + 1):
+        for start in range(end):
+            if start in best and word[start:end] in vocabulary and (start, end) != (0, len(word)):
+                best[end] = best[start] + (word[start:end],)
+                break
+    return best.get(len(word))
+
+
+@lru_cache(maxsize=settings.CHINESE_SEGMENTATION['CACHE_SIZE'])
+def _cut(text, joins=(), splits=()):
+    base = get_tokenizer()
+    segmenter = OverlayTokenizer(base, joins, splits) if joins or splits else base
+    return tuple(
+        w for w in segmenter.cut(text)
+        if w.strip() and w not in zhon.hanzi.punctuation
+    )
+
+
+def segment(text, custom_words=()):
+    """
+    Split Chinese ``text`` into words, dropping punctuation.
+
+    ``custom_words`` (typically the words the recognizer returned) steer the
+    segmentation for this call only. Texts whose segmentation already agrees
+    with them are served straight from the cache of reference segmentations.
+    """
+    words = _cut(text)
+    vocabulary = {w for w in custom_words if w}
+    known = set(words)
+
+    joins = tuple(sorted(w for w in vocabulary if len(w) > 1 and w not in known and w in text))
+    splits = []
+    for word in known - vocabulary:
+        parts = _decompose(word, vocabulary) if len(word) > 1 else None
+        if parts:
+            splits.append((word, parts))
+
+    if not joins and not splits:
+        return list(words)
+    return list(_cut(text, joins, tuple(sorted(splits))))
+
+
+def tokenize_reference(reference_text, target_language, recognized_words=()):
+    """Split a reference text into the words the assessment is scored against."""
+    if target_language == 'zh-CN':
+        return segment(reference_text, recognized_words)
+
+    return [w.strip(string.punctuation) for w in reference_text.lower().split()]
+
+
+def cache_stats():
+    info = _cut.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
+
+
+def warm_up():
+    get_tokenizer()
@@ -0,0 +1,17 @@
+from rest_framework import serializers
+
+from .models import Job, Passage
+
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = ['id', 'kind', 'queue', 'status', 'params', 'audio_duration', 'result', 'error',
+                  'created_at', 'started_at', 'finished_at']
+
+
+class PassageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Passage
+        fields = ['id', 'title', 'language', 'text', 'tokens', 'word_count', 'created_at']
+        read_only_fields = ['tokens', 'word_count', 'created_at']
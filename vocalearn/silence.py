@@ -0,0 +1,81 @@
+"""
+Splitting decoded PCM at pauses, so long recordings can be recognized as
+several independent chunks without cutting through words.
+"""
+import math
+
+from django.conf import settings
+
+from .audio import BYTES_PER_SECOND
+from .vad import FRAME_MS, energy_limit, frame_rms
+
+FRAME_BYTES = BYTES_PER_SECOND * FRAME_MS // 1000
+FRAMES_PER_SECOND = 1000 // FRAME_MS
+
+
+def frame_energies(pcm):
+    return frame_rms(pcm).tolist()
+
+
+def silent_midpoints(energies, threshold, min_silence_frames):
+    """Frame index in the middle of every run of at least ``min_silence_frames`` quiet frames."""
+    limit = energy_limit(energies, threshold)
+
+    midpoints = []
+    run_start = None
+    for i, energy in enumerate(energies + [math.inf]):
+        if energy < limit:
+            if run_start is None:
+                run_start = i
+        elif run_start is not None:
+            if i - run_start >= min_silence_frames:
+                midpoints.append((run_start + i) // 2)
+            run_start = None
+    return midpoints
+
+
+def _quietest(energies, start, end):
+    return min(range(start, end), key=energies.__getitem__)
+
+
+def find_split_points(energies, target_frames, max_frames, candidates):
+    """
+    Pick cut points from ``candidates`` (pause midpoints) so chunks are at least
+    ``target_frames`` long. A stretch with no usable pause is cut at its quietest
+    frame so no chunk exceeds ``max_frames``.
+    """
+    points = []
+    start = 0
+    for candidate in candidates + [len(energies)]:
+        while candidate - start > max_frames:
+            start = _quietest(energies, start + target_frames, start + max_frames)
+            points.append(start)
+        if candidate - start >= target_frames and candidate < len(energies):
+            points.append(candidate)
+            start = candidate
+    return points
+
+
+def split_on_silence(pcm):
+    """
+    Split ``pcm`` at pauses into chunks of roughly SPEECH_SPLITTING['TARGET_CHUNK_SECONDS'].
+    Returns a list of ``(offset_seconds, chunk_pcm)``.
+    """
+    config = settings.SPEECH_SPLITTING
+    energies = frame_energies(pcm)
+    candidates = silent_midpoints(
+        energies, config["SILENCE_THRESHOLD"], config["MIN_SILENCE_MS"] // FRAME_MS
+    )
+    points = find_split_points(
+        energies,
+        config["TARGET_CHUNK_SECONDS"] * FRAMES_PER_SECOND,
+        config["MAX_CHUNK_SECONDS"] * FRAMES_PER_SECOND,
+        candidates,
+    )
+
+    offsets = [0] + [point * FRAME_BYTES for point in points] + [len(pcm)]
+    return [
+        (start / BYTES_PER_SECOND, pcm[start:end])
+        for start, end in zip(offsets, offsets[1:])
+        if end > start
+    ]
@@ -0,0 +1,127 @@
+import logging
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+import azure.cognitiveservices.speech as speechsdk
+
+from . import resilience
+
+logger = logging.getLogger(__name__)
+
+speech_services_key = settings.AZURE_SPEECH_KEY
+
+# Primary region first; recognizers move to the failover region while the primary's circuit is open.
+speech_regions = [
+    resilience.Upstream("speech", region, key=key)
+    for region, key in [
+        (settings.AZURE_SPEECH_REGION, speech_services_key),
+        (settings.AZURE_SPEECH_FAILOVER_REGION, settings.AZURE_SPEECH_FAILOVER_KEY),
+    ]
+    if region
+]
+
+
+class ConfigPool:
+    """
+    Per-worker LRU of pre-built SDK configuration objects.
+
+    Recognizers copy the properties they need when they are constructed, so a
+    pooled config can back any number of concurrent recognizers as long as it is
+    never mutated after it has been built.
+    """
+
+    def __init__(self, name, factory, max_size):
+        self.name = name
+        self.factory = factory
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item
+            self.misses += 1
+
+        item = self.factory(*key)
+        with self._lock:
+            self._items[key] = item
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+        return item
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "size": len(self._items),
+            "max_size": self.max_size,
+        }
+
+
+def _build_speech_config(language, region, key):
+    speech_config = speechsdk.SpeechConfig(subscription=key, region=region)
+    if language:
+        speech_config.speech_recognition_language = language
+    return speech_config
+
+
+def _build_pronunciation_config(reference_text, granularity, enable_prosody_assessment, enable_miscue):
+    pronunciation_config = speechsdk.PronunciationAssessmentConfig(
+        reference_text=reference_text,
+        grading_system=speechsdk.PronunciationAssessmentGradingSystem.HundredMark,
+        granularity=granularity,
+        enable_miscue=enable_miscue)
+
+    if enable_prosody_assessment:
+        pronunciation_config.enable_prosody_assessment()
+    return pronunciation_config
+
+
+speech_configs = ConfigPool("speech", _build_speech_config, settings.SPEECH_CONFIG_POOL["MAX_LANGUAGES"])
+pronunciation_configs = ConfigPool(
+    "pronunciation", _build_pronunciation_config, settings.SPEECH_CONFIG_POOL["MAX_ASSESSMENT_CONFIGS"]
+)
+
+
+def get_speech_config(language=None):
+    """Config for the first region whose circuit is closed; raises resilience.CircuitOpen if there is none."""
+    region = resilience.first_available(speech_regions)
+    return speech_configs.get((language or None, region.name, region.key))
+
+
+def get_region(name):
+    return next(region for region in speech_regions if region.name == name)
+
+
+def get_pronunciation_config(reference_text, granularity=speechsdk.PronunciationAssessmentGranularity.Phoneme,
+                             enable_prosody_assessment=True, enable_miscue=True):
+    return pronunciation_configs.get((reference_text, granularity, enable_prosody_assessment, enable_miscue))
+
+
+def warm_up(languages):
+    """Build the speech configs for ``languages`` ahead of the first request."""
+    if not speech_services_key:
+        return
+
+    for language in languages:
+        try:
+            get_speech_config(language)
+        except Exception as e:
+            logger.warning(f"Could not warm speech config for {language}: {e}")
+
+    # Warm-up lookups are not real traffic.
+    speech_configs.misses = 0
+
+
+def pool_stats():
+    return {pool.name: pool.stats() for pool in (speech_configs, pronunciation_configs)}
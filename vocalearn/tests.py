@@ -1,3 +1,607 @@
-from django.test import TestCase
+import asyncio
+import difflib
+import hashlib
+import json
+import os
+import random
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import azure.cognitiveservices.speech as speechsdk
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from . import admission, alignment, documents, jobs, resilience, scoring, translator, vad
+from .cache import LRUCache, SpeechResultCache, TranslationCache
+from .models import Job
+from .uploads import upload_digest
+
+
+def levenshtein(reference, recognized):
+    """Plain O(n * m) edit distance over normalized words, as the reference for the aligner."""
+    reference = [alignment.normalize_word(w) for w in reference]
+    recognized = [alignment.normalize_word(w) for w in recognized]
+    previous = list(range(len(recognized) + 1))
+    for i, word in enumerate(reference, 1):
+        current = [i]
+        for j, other in enumerate(recognized, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (word != other)))
+        previous = current
+    return previous[-1]
+
+
+def difflib_opcodes(reference, recognized):
+    """The difflib path the aligner replaced, on the same normalized words."""
+    return difflib.SequenceMatcher(
+        None, [alignment.normalize_word(w) for w in reference], [alignment.normalize_word(w) for w in recognized],
+        autojunk=False,
+    ).get_opcodes()
+
+
+class AlignmentTests(SimpleTestCase):
+    vocabulary = ["the", "a", "fox", "dog", "jumps", "over", "lazy", "quick", "brown", "cat"]
+
+    def assert_valid(self, opcodes, reference, recognized):
+        """Opcodes cover both sequences in order, and 'equal' spans hold equal words."""
+        i = j = 0
+        for tag, i1, i2, j1, j2 in opcodes:
+            self.assertEqual((i1, j1), (i, j))
+            if tag == "equal":
+                self.assertEqual([alignment.normalize_word(w) for w in reference[i1:i2]],
+                                 [alignment.normalize_word(w) for w in recognized[j1:j2]])
+            i, j = i2, j2
+        self.assertEqual((i, j), (len(reference), len(recognized)))
+
+    def test_minimal_on_random_passages(self):
+        rng = random.Random(0)
+        for _ in range(300):
+            reference = rng.choices(self.vocabulary, k=rng.randint(0, 30))
+            recognized = rng.choices(self.vocabulary, k=rng.randint(0, 30))
+            opcodes = alignment.align(reference, recognized)
+            self.assert_valid(opcodes, reference, recognized)
+            expected = levenshtein(reference, recognized)
+            self.assertEqual(alignment.edit_count(opcodes), expected)
+            self.assertEqual(alignment.distance(reference, recognized), expected)
+            # difflib is not always minimal, but never does better.
+            self.assertLessEqual(expected, alignment.edit_count(difflib_opcodes(reference, recognized)))
+
+    def test_omissions_and_insertions_match_difflib(self):
+        rng = random.Random(1)
+        words = [f"word{i}" for i in range(60)]
+        for _ in range(100):
+            reference = rng.sample(words, 40)
+            omitted = [w for w in reference if rng.random() > 0.2]
+            self.assertEqual(alignment.align(reference, omitted), difflib_opcodes(reference, omitted))
+
+            extra = iter(w for w in words if w not in reference)
+            inserted = [w for word in reference for w in ([word, next(extra)] if rng.random() < 0.2 else [word])]
+            self.assertEqual(alignment.align(reference, inserted), difflib_opcodes(reference, inserted))
+
+    def test_empty_sequences(self):
+        self.assertEqual(alignment.align([], []), [])
+        self.assertEqual(alignment.align(["a", "b"], []), [("delete", 0, 2, 0, 0)])
+        self.assertEqual(alignment.align([], ["a", "b"]), [("insert", 0, 0, 0, 2)])
+
+    def test_normalized_words_are_equal(self):
+        self.assertEqual(alignment.align(["Hello,", "world"], ["hello", "World!"]), [("equal", 0, 2, 0, 2)])
+
+
+def make_segment(words, fluency=90, prosody=80.0):
+    """A SpeechServiceResponse_JsonResult for ``words``: ``(word, accuracy, error_type, offset, duration)`` tuples."""
+    assessment = {"FluencyScore": fluency}
+    if prosody is not None:
+        assessment["ProsodyScore"] = prosody
+    return json.dumps({"NBest": [{
+        "PronunciationAssessment": assessment,
+        "Words": [
+            {"Word": word, "Offset": offset, "Duration": duration,
+             "PronunciationAssessment": {"AccuracyScore": accuracy, "ErrorType": error}}
+            for word, accuracy, error, offset, duration in words
+        ],
+    }]})
+
+
+def previous_scores(segments, reference_words, enable_miscue=True):
+    """The loop-based aggregation over SDK word objects that scoring.aggregate replaced."""
+    recognized_words, prosody_scores, fluency_scores, durations = [], [], [], []
+    for segment in segments:
+        best = json.loads(segment)["NBest"][0]
+        recognized_words += [speechsdk.PronunciationAssessmentWordResult(w) for w in best["Words"]]
+        fluency_scores.append(best["PronunciationAssessment"]["FluencyScore"])
+        if best["PronunciationAssessment"].get("ProsodyScore") is not None:
+            prosody_scores.append(best["PronunciationAssessment"]["ProsodyScore"])
+        durations.append(sum(int(w["Duration"]) for w in best["Words"]))
+
+    final_words = recognized_words
+    if enable_miscue:
+        final_words = []
+        for tag, i1, i2, j1, j2 in alignment.align(reference_words, [w.word for w in recognized_words]):
+            if tag in ["insert", "replace"]:
+                for word in recognized_words[j1:j2]:
+                    if word.error_type == "None":
+                        word._error_type = "Insertion"
+                    final_words.append(word)
+            if tag in ["delete", "replace"]:
+                final_words += [
+                    speechsdk.PronunciationAssessmentWordResult(
+                        {"Word": w, "PronunciationAssessment": {"ErrorType": "Omission"}}
+                    )
+                    for w in reference_words[i1:i2]
+                ]
+            if tag == "equal":
+                final_words += recognized_words[j1:j2]
+
+    accuracy_scores = [w.accuracy_score for w in final_words if w.error_type != "Insertion"]
+    completeness = len([w for w in recognized_words if w.error_type == "None"]) / len(reference_words) * 100
+    return {
+        "accuracyScore": sum(accuracy_scores) / len(accuracy_scores),
+        "prosodyScore": sum(prosody_scores) / len(prosody_scores) if prosody_scores else "nan",
+        "completenessScore": min(completeness, 100),
+        "fluency_score": sum(f * d for f, d in zip(fluency_scores, durations)) / sum(durations),
+    }
+
+
+def records_of(segments):
+    records = scoring.AssessmentRecords()
+    for segment in segments:
+        records.add_segment(segment)
+    return records
+
+
+class ScoringTests(SimpleTestCase):
+    vocabulary = ["the", "quick", "brown", "fox", "jumps", "over", "lazy", "dog"]
+    error_types = ["None", "None", "None", "Mispronunciation", "Omission", "Insertion", "UnexpectedBreak"]
+
+    def random_case(self, rng):
+        reference = rng.choices(self.vocabulary, k=rng.randint(1, 25))
+        segments = []
+        for _ in range(rng.randint(1, 4)):
+            words = [
+                (rng.choice(self.vocabulary), rng.randint(0, 100), rng.choice(self.error_types),
+                 rng.randint(0, 10 ** 8), rng.choice([0, rng.randint(1, 10 ** 7)]))
+                for _ in range(rng.randint(1, 10))
+            ]
+            segments.append(make_segment(words, rng.randint(0, 100), rng.choice([None, rng.uniform(0, 100)])))
+        return segments, reference
+
+    def test_matches_previous_implementation(self):
+        rng = random.Random(0)
+        compared = 0
+        while compared < 300:
+            segments, reference = self.random_case(rng)
+            enable_miscue = rng.random() < 0.8
+            try:
+                expected = previous_scores(segments, reference, enable_miscue)
+            except ZeroDivisionError:
+                continue  # The cases the previous implementation could not score; see the edge-case tests.
+            scores = scoring.aggregate(records_of(segments), reference, enable_miscue)
+            for field in scoring.SCORE_FIELDS:
+                if expected[field] == "nan":
+                    self.assertEqual(scores[field], "nan")
+                else:
+                    self.assertAlmostEqual(scores[field], expected[field], places=9)
+            compared += 1
+
+    def test_no_words(self):
+        scores = scoring.aggregate(records_of([make_segment([], prosody=None)]), ["the", "fox"])
+        self.assertEqual(scores, {"accuracyScore": 0.0, "prosodyScore": "nan", "completenessScore": 0.0,
+                                  "fluency_score": 90.0})
+
+        scores = scoring.aggregate(records_of([]), ["the", "fox"], include_words=True)
+        self.assertEqual(scores["accuracyScore"], 0.0)
+        self.assertEqual(scores["fluency_score"], 0.0)
+        self.assertEqual([w["errorType"] for w in scores["words"]], ["Omission", "Omission"])
+
+    def test_ignores_empty_results(self):
+        records = records_of(["", json.dumps({"NBest": []}), json.dumps({"RecognitionStatus": "NoMatch"})])
+        self.assertEqual(records.words, [])
+        self.assertEqual(len(records.arrays()[0]), 0)
+
+    def test_zero_durations(self):
+        segments = [make_segment([("the", 80, "None", 0, 0)], fluency=60),
+                    make_segment([("fox", 90, "None", 0, 0)], fluency=100)]
+        scores = scoring.aggregate(records_of(segments), ["the", "fox"])
+        self.assertEqual(scores["fluency_score"], 80.0)
+        self.assertEqual(scores["accuracyScore"], 85.0)
+
+    def test_empty_reference(self):
+        segments = [make_segment([("the", 80, "None", 0, 10), ("fox", 90, "None", 10, 10)])]
+        scores = scoring.aggregate(records_of(segments), [])
+        self.assertEqual(scores["completenessScore"], 0.0)
+        # Against an empty reference every word is an insertion, so nothing is scored.
+        self.assertEqual(scores["accuracyScore"], 0.0)
+
+        scores = scoring.aggregate(records_of(segments), [], enable_miscue=False)
+        self.assertEqual(scores["accuracyScore"], 85.0)
+
+    def test_word_details_in_reading_order(self):
+        segments = [make_segment([("the", 80, "None", 0, 2_000_000), ("big", 70, "None", 3_000_000, 1_000_000),
+                                  ("dog", 90, "None", 5_000_000, 2_000_000)])]
+        scores = scoring.aggregate(records_of(segments), ["the", "fox", "dog"], include_words=True, offset=1.5)
+        self.assertEqual(
+            [(w["word"], w["errorType"], w["offset"]) for w in scores["words"]],
+            [("the", "None", 1.5), ("big", "Insertion", 1.8), ("fox", "Omission", None), ("dog", "None", 2.0)],
+        )
+        # One omission scored 0 next to two scored words; the insertion is not scored.
+        self.assertAlmostEqual(scores["accuracyScore"], (80 + 90) / 3)
+
+
+class TranslationPlanningTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(translator, "translation_cache", TranslationCache(100, 10 ** 6, 60))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_pack_texts_element_and_character_limits(self):
+        with mock.patch.object(translator, "max_elements_per_request", 3), \
+                mock.patch.object(translator, "max_characters_per_request", 100):
+            self.assertEqual([len(chunk) for chunk in translator.pack_texts(["a"] * 7, 1)], [3, 3, 1])
+            # Characters count once per target language: two 40-character texts make 160 for two targets.
+            self.assertEqual([len(chunk) for chunk in translator.pack_texts(["x" * 40] * 3, 2)], [1, 1, 1])
+            self.assertEqual([len(chunk) for chunk in translator.pack_texts(["x" * 40] * 3, 1)], [2, 1])
+
+    def test_pack_texts_rejects_oversized_text(self):
+        with mock.patch.object(translator, "max_characters_per_request", 100):
+            with self.assertRaises(translator.TranslationError) as raised:
+                list(translator.pack_texts(["x" * 60], 2))
+        self.assertEqual(raised.exception.status_code, 400)
+        self.assertEqual(raised.exception.details, {"max_characters": 50})
+
+    def test_coalesces_normalized_duplicates(self):
+        sent = []
+
+        def translate_chunk(texts, languages):
+            sent.append((texts, languages))
+            return [{language: f"[{language}] {text}" for language in languages} for text in texts]
+
+        texts = ["Hello\nworld", "Hello  world", "Bye"]
+        with mock.patch.object(translator, "translate_chunk", translate_chunk):
+            results = translator.translate_texts(texts, ["fr", "de"])
+            self.assertEqual(sent, [(["Hello\nworld", "Bye"], ("fr", "de"))])
+            self.assertEqual(results[0], results[1])
+            self.assertEqual(results[1]["de"], "[de] Hello\nworld")
+
+            # Served from the cache; only the language nobody asked for yet is sent.
+            results = translator.translate_texts(texts, ["fr", "es"])
+            self.assertEqual(sent[1], (["Hello\nworld", "Bye"], ("es",)))
+            self.assertEqual(results[2], {"fr": "[fr] Bye", "es": "[es] Bye"})
+
+
+def uppercase_translations(texts, languages):
+    return [{language: text.upper() for language in languages} for text in texts]
+
+
+@override_settings(TRANSLATION_DOCUMENT={"CHUNK_CHARACTERS": 40, "CONCURRENCY": 4, "MAX_CHARACTERS": 10000})
+class DocumentTests(SimpleTestCase):
+    text = ("  First sentence here. Second one follows!\n\n\tA new paragraph, longer than one chunk can hold "
+            "without being cut at a space.\nSame paragraph, next line?  \n\n\n中文句子。另一个句子！\n")
+
+    def test_chunks_rejoin_to_the_text(self):
+        chunks = documents.chunk_text(self.text)
+        self.assertEqual("".join(chunks), self.text)
+        self.assertTrue(all(len(chunk) <= 40 for chunk in chunks))
+
+    def test_translation_keeps_the_layout(self):
+        sent = []
+
+        def translate_texts(texts, languages):
+            sent.extend(texts)
+            return uppercase_translations(texts, languages)
+
+        with mock.patch.object(documents, "translate_texts", translate_texts):
+            self.assertEqual(documents.translate_document(self.text, "fr"), self.text.upper())
+        self.assertFalse([line for line in sent if "\n" in line or line != line.strip()])
+
+    async def test_async_translation_keeps_the_layout(self):
+        async def translate_texts_async(texts, languages):
+            return uppercase_translations(texts, languages)
+
+        with mock.patch.object(documents, "translate_texts_async", translate_texts_async):
+            self.assertEqual(await documents.translate_document_async(self.text, "fr"), self.text.upper())
+
+
+ADMISSION_CONTROL = {
+    "ENABLED": True,
+    "CACHE": "admission",
+    "LEASE_TIMEOUT": 600,
+    "POOLS": {"speech": 2},
+    "MAX_QUEUED": 4,
+    "MAX_WAIT": 0.05,
+    "SCOPES": {"speech": {"POOL": "speech", "RATE": 1.0, "BURST": 3, "USER_CONCURRENCY": 1}},
+}
+
+
+@override_settings(ADMISSION_CONTROL=ADMISSION_CONTROL)
+class AdmissionTests(SimpleTestCase):
+    def setUp(self):
+        admission.get_cache().clear()
+
+    def assert_user_slot_free(self, key):
+        probe = admission.Admission("speech", key)
+        probe._acquire_user_slot()
+        probe.release()
+
+    def test_token_bucket(self):
+        self.assertEqual(admission.take_token("speech", "ip:1", cost=2), 0)
+        self.assertEqual(admission.take_token("speech", "ip:1"), 0)
+        self.assertGreater(admission.take_token("speech", "ip:1"), 0)
+        # A cost above BURST pays a full bucket rather than never being admitted.
+        self.assertEqual(admission.take_token("speech", "ip:2", cost=10), 0)
+
+    def test_user_concurrency(self):
+        first = admission.Admission("speech", "ip:1")
+        first.acquire()
+        with self.assertRaises(admission.Rejected) as raised:
+            admission.Admission("speech", "ip:1").acquire()
+        self.assertEqual(raised.exception.status_code, 429)
+
+        first.release()
+        self.assertEqual(first.held, [])
+        self.assert_user_slot_free("ip:1")
+
+    def test_global_slots_are_all_or_nothing(self):
+        blocker = admission.Admission("speech", "ip:1")
+        blocker.acquire()
+
+        batch = admission.Admission("speech", "ip:2", sessions=2)
+        with self.assertRaises(admission.Rejected) as raised:
+            batch.acquire()
+        self.assertEqual(raised.exception.status_code, 503)
+        self.assertEqual(batch.held, [])
+        self.assert_user_slot_free("ip:2")
+
+        blocker.release()
+        batch.acquire()
+        self.assertEqual(len(batch.held), 3)
+        batch.release()
+
+    @override_settings(ADMISSION_CONTROL={**ADMISSION_CONTROL, "MAX_QUEUED": 0})
+    def test_full_queue_releases_the_user_slot(self):
+        blocker = admission.Admission("speech", "ip:1", sessions=2)
+        blocker.acquire()
+        with self.assertRaises(admission.Rejected):
+            admission.Admission("speech", "ip:2").acquire()
+        self.assert_user_slot_free("ip:2")
+        blocker.release()
+
+    @override_settings(ADMISSION_CONTROL={**ADMISSION_CONTROL, "MAX_WAIT": 5.0})
+    async def test_cancelled_wait_releases_the_user_slot(self):
+        blocker = admission.Admission("speech", "ip:1", sessions=2)
+        await sync_to_async(blocker.acquire)()
+
+        waiting = admission.Admission("speech", "ip:2")
+        task = asyncio.ensure_future(waiting.acquire_async())
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertEqual(waiting.held, [])
+        self.assertEqual(admission.waiters._count, 0)
+        await sync_to_async(blocker.release)()
+
+    def test_view_error_releases_the_slots(self):
+        @admission.admission_control("speech")
+        def view(request):
+            raise ValueError("boom")
+
+        request = RequestFactory().post("/")
+        request.user = AnonymousUser()
+        with self.assertRaises(ValueError):
+            view(request)
+        self.assert_user_slot_free("ip:127.0.0.1")
+
+
+@override_settings(UPSTREAM_RESILIENCE={"FAILURE_THRESHOLD": 2, "RESET_TIMEOUT": 30, "HEDGE": False,
+                                        "LATENCY_WINDOW": 10})
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(resilience.time, "monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_state_changes(self):
+        breaker = resilience.CircuitBreaker("translator", "primary")
+        breaker.record_failure()
+        self.assertEqual(breaker.state, breaker.CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, breaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+        # One probe after RESET_TIMEOUT; its failure opens the circuit again.
+        self.now += 31
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, breaker.HALF_OPEN)
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, breaker.OPEN)
+
+        self.now += 31
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual((breaker.state, breaker.failures), (breaker.CLOSED, 0))
+        self.assertTrue(breaker.allow())
+
+    def test_success_resets_the_failure_count(self):
+        breaker = resilience.CircuitBreaker("translator", "primary")
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, breaker.CLOSED)
+
+    def test_failover(self):
+        upstreams = [resilience.Upstream("translator", "primary"), resilience.Upstream("translator", "failover")]
+
+        def send(upstream):
+            if upstream.name == "primary":
+                raise resilience.UpstreamFailure("timeout")
+            return upstream.name
+
+        self.assertEqual(resilience.call(upstreams, send), "failover")
+        self.assertEqual(resilience.call(upstreams, send), "failover")
+        # The primary's circuit is open now, so it is not even tried.
+        self.assertEqual(resilience.call(upstreams, lambda upstream: upstream.name), "failover")
+
+        upstreams[1].breaker.record_failure()
+        upstreams[1].breaker.record_failure()
+        with self.assertRaises(resilience.CircuitOpen):
+            resilience.call(upstreams, send)
+
+
+class TwoTierCacheTests(SimpleTestCase):
+    def test_lru_limits(self):
+        lru = LRUCache(max_entries=2, max_bytes=10, ttl=60)
+        lru.set("a", "A", 1)
+        lru.set("b", "B", 1)
+        lru.get("a")
+        lru.set("c", "C", 1)
+        self.assertEqual([lru.get(key) for key in "abc"], ["A", None, "C"])
+
+        # Over MAX_BYTES: the least recently used entry goes.
+        lru.set("d", "D", 9)
+        self.assertEqual([lru.get(key) for key in "acd"], [None, "C", "D"])
+        self.assertEqual(lru.size_bytes, 10)
+        lru.set("e", "E", 11)
+        self.assertIsNone(lru.get("e"))
+
+    def test_lru_expiry(self):
+        lru = LRUCache(max_entries=2, max_bytes=10, ttl=60)
+        with mock.patch("vocalearn.cache.time.monotonic", return_value=0):
+            lru.set("a", "A", 1)
+        with mock.patch("vocalearn.cache.time.monotonic", return_value=61):
+            self.assertIsNone(lru.get("a"))
+        self.assertEqual(lru.size_bytes, 0)
+
+    @override_settings(CACHES={"shared": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                                          "LOCATION": "two-tier-tests"}})
+    def test_shared_tier(self):
+        writer = SpeechResultCache(10, 10 ** 6, 60, shared_alias="shared")
+        reader = SpeechResultCache(10, 10 ** 6, 60, shared_alias="shared")
+        key = writer.make_key("transcription", "digest", "en-US")
+        self.assertIsNone(reader.get(key))
+        writer.set(key, {"transcription": "hello"})
+        self.assertEqual(reader.get(key), {"transcription": "hello"})
+        self.assertEqual(reader.get(key), {"transcription": "hello"})
+        self.assertEqual({k: v for k, v in reader.stats().items() if k.endswith(("hits", "misses"))},
+                         {"local_hits": 1, "shared_hits": 1, "misses": 1})
+
+    def test_translation_keys_are_normalized(self):
+        cache = TranslationCache(10, 10 ** 6, 60)
+        cache.set("Hello  world", "FR", "3.0", "Bonjour le monde")
+        self.assertEqual(cache.get(" Hello world", "fr", "3.0"), "Bonjour le monde")
+        self.assertEqual(cache.stats()["saved_characters"], len(" Hello world"))
+
+
+def tone(seconds, amplitude=8000):
+    t = np.arange(int(16000 * seconds)) / 16000
+    return (amplitude * np.sin(2 * np.pi * 440 * t)).astype("<i2").tobytes()
+
+
+def silence(seconds):
+    return bytes(2 * int(16000 * seconds))
+
+
+class SilenceTrimTests(SimpleTestCase):
+    def test_trims_both_ends(self):
+        pcm = silence(0.5) + tone(1.0) + silence(0.3)
+        trimmed, leading, trailing = vad.trim_silence(pcm, threshold=500, padding_ms=100)
+        self.assertAlmostEqual(leading, 0.4, places=2)
+        self.assertAlmostEqual(trailing, 0.2, places=2)
+        self.assertEqual(len(trimmed), len(pcm) - round((leading + trailing) * 32000))
+
+    def test_silent_audio_is_untouched(self):
+        pcm = silence(1.0)
+        self.assertEqual(vad.trim_silence(pcm, threshold=500, padding_ms=100), (pcm, 0.0, 0.0))
+
+    @override_settings(AUDIO_PREPROCESSING={"transcription": {"TRIM": True, "THRESHOLD": 500, "PADDING_MS": 0,
+                                                              "NORMALIZE": False}})
+    def test_preprocess_reports_the_leading_offset(self):
+        _, report = vad.preprocess(silence(0.5) + tone(1.0), "transcription")
+        self.assertEqual(report, {"trimmed_seconds": 0.5, "leading_seconds": 0.5, "gain_db": 0.0})
+
+
+class UploadDigestTests(SimpleTestCase):
+    def test_digests_match_the_files(self):
+        first, second = b"first clip" * 1000, b"second clip"
+        request = RequestFactory().post("/", {"audio": [SimpleUploadedFile("a.wav", first),
+                                                        SimpleUploadedFile("b.wav", second)]})
+        request.FILES  # Parse the body through the upload handlers.
+        self.assertEqual(len(request.upload_digests["audio"]), 2)
+        self.assertEqual(upload_digest(request, "audio"), hashlib.sha256(first).hexdigest())
+        self.assertEqual(upload_digest(request, "audio", 1), hashlib.sha256(second).hexdigest())
+
+        del request.upload_digests
+        self.assertEqual(upload_digest(request, "audio", 1), hashlib.sha256(second).hexdigest())
+
+
+class JobTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.settings_override = override_settings(JOB_AUDIO_ROOT=directory)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.audio_root = directory
+
+    def make_job(self, status=Job.STATUS_PENDING, **fields):
+        job = Job(kind=Job.KIND_TRANSCRIPTION, queue=Job.KIND_TRANSCRIPTION, status=status, audio_duration=1.0,
+                  **fields)
+        job.audio_path = os.path.join(self.audio_root, f"{job.pk}.pcm")
+        with open(job.audio_path, "wb") as f:
+            f.write(silence(1.0))
+        job.save()
+        return job
+
+    def test_a_job_runs_once(self):
+        job = self.make_job()
+        runner = mock.Mock(return_value={"transcription": "hello"})
+        with mock.patch.dict(jobs.JOB_RUNNERS, {Job.KIND_TRANSCRIPTION: runner}):
+            jobs.run_job(job.pk)
+            jobs.run_job(job.pk)
+
+        runner.assert_called_once()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), (Job.STATUS_SUCCEEDED, {"transcription": "hello"}))
+        self.assertFalse(os.path.exists(job.audio_path))
+
+    def test_failed_runner_fails_the_job(self):
+        job = self.make_job()
+        with mock.patch.dict(jobs.JOB_RUNNERS, {Job.KIND_TRANSCRIPTION: mock.Mock(side_effect=RuntimeError("boom"))}), \
+                self.assertLogs("vocalearn.jobs", "ERROR"):
+            jobs.run_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (Job.STATUS_FAILED, "boom"))
+
+    @override_settings(SPEECH_RECOGNITION_TIMEOUT=60, JOB_STALE_AFTER=600)
+    def test_stale_running_jobs_fail(self):
+        now = timezone.now()
+        stale = self.make_job(Job.STATUS_RUNNING, started_at=now - timedelta(seconds=700))
+        live = self.make_job(Job.STATUS_RUNNING, started_at=now - timedelta(seconds=600))
+        with self.assertLogs("vocalearn.jobs", "WARNING"):
+            jobs.fail_stale_jobs()
+
+        stale.refresh_from_db()
+        live.refresh_from_db()
+        self.assertEqual(stale.status, Job.STATUS_FAILED)
+        self.assertFalse(os.path.exists(stale.audio_path))
+        self.assertEqual(live.status, Job.STATUS_RUNNING)
+
+    def test_recovery_requeues_pending_jobs(self):
+        pending = self.make_job()
+        lost = self.make_job()
+        os.remove(lost.audio_path)
+
+        queue = mock.Mock()
+        with mock.patch.object(jobs, "get_queue", return_value=queue), mock.patch.object(jobs, "_recovered_pid", None):
+            jobs.recover_jobs()
+            jobs.recover_jobs()
+
+        queue.submit.assert_called_once_with(pending)
+        lost.refresh_from_db()
+        self.assertEqual(lost.status, Job.STATUS_FAILED)
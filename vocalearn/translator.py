@@ -0,0 +1,303 @@
+import asyncio
+import functools
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+
+import httpx
+import requests
+from django.conf import settings
+
+from . import http_client, metrics, resilience
+from .cache import normalize_text, translation_cache
+from .executor import run_in_executor
+
+text_api_key = settings.AZURE_TRANSLATE_KEY
+endpoint_text = settings.AZURE_TRANSLATE_API_ENDPOINT_TEXT
+api_version = settings.AZURE_TRANSLATE_API_VERSION
+
+# Primary endpoint first; the failover one is used while the primary's circuit is open or a call to it fails.
+upstreams = [
+    resilience.Upstream("translator", url, url=url, key=key, region=region)
+    for url, key, region in [
+        (endpoint_text, text_api_key, settings.AZURE_TRANSLATE_REGION),
+        (settings.AZURE_TRANSLATE_FAILOVER_ENDPOINT, settings.AZURE_TRANSLATE_FAILOVER_KEY,
+         settings.AZURE_TRANSLATE_FAILOVER_REGION),
+    ]
+    if url
+]
+
+# Azure Translator v3 limits for a single /translate call. Characters are
+# billed (and limited) once per target language.
+max_elements_per_request = settings.AZURE_TRANSLATE_MAX_ELEMENTS
+max_characters_per_request = settings.AZURE_TRANSLATE_MAX_CHARACTERS
+
+
+class TranslationError(Exception):
+    def __init__(self, message, status_code=500, details=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.details = details
+
+
+class InFlightRequests:
+    """
+    Coalesces identical concurrent calls: the first caller for a key runs the
+    call, everyone else arriving before it finishes waits for the same result.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def run(self, key, func, *args):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(func(*args))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+        return future.result()
+
+
+class AsyncInFlightRequests:
+    """Event-loop counterpart of InFlightRequests for the async views."""
+
+    def __init__(self):
+        self._calls = {}
+        self.coalesced = 0
+
+    async def run(self, key, func, *args):
+        task = self._calls.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(func(*args))
+        self._calls[key] = task
+        task.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(task)
+
+
+in_flight = InFlightRequests()
+async_in_flight = AsyncInFlightRequests()
+
+
+def translate_texts(texts, target_languages):
+    """
+    Translate every text into every target language, returning a list with
+    one ``{language: translation}`` dict per input text.
+
+    Cached pairs are served locally; the remaining ones are deduplicated and
+    packed into as few Translator calls as the per-call limits allow. Texts are
+    deduplicated by their normalized form, but sent as written (the first
+    spelling seen), so line breaks reach the Translator.
+    """
+    results, missing, chunks = _plan(texts, target_languages)
+    for chunk, languages in chunks:
+        _apply(results, missing, chunk, translate_chunk(chunk, languages))
+    return results
+
+
+async def translate_texts_async(texts, target_languages):
+    """
+    Async counterpart of translate_texts; the chunks are sent concurrently. The
+    cache lookups and writes run on the executor, since the shared tier may be
+    on disk.
+    """
+    results, missing, chunks = await run_in_executor(_plan, texts, target_languages)
+    responses = await asyncio.gather(*[translate_chunk_async(chunk, languages) for chunk, languages in chunks])
+    for (chunk, _), translations in zip(chunks, responses):
+        await run_in_executor(_apply, results, missing, chunk, translations)
+    return results
+
+
+def _plan(texts, target_languages):
+    results = [{} for _ in texts]
+    # Result indices by normalized text and language, and the spelling sent for each normalized text.
+    missing = {}
+    originals = {}
+
+    for index, text in enumerate(texts):
+        for language in target_languages:
+            translation = translation_cache.get(text, language, api_version)
+            if translation is not None:
+                results[index][language] = translation
+            else:
+                key = normalize_text(text)
+                missing.setdefault(key, {}).setdefault(language, []).append(index)
+                originals.setdefault(key, text)
+
+    # Texts missing the same set of languages can share a call with several `to` params.
+    groups = {}
+    for key, languages in missing.items():
+        groups.setdefault(tuple(languages), []).append(originals[key])
+
+    chunks = [
+        (chunk, languages)
+        for languages, group_texts in groups.items()
+        for chunk in pack_texts(group_texts, len(languages))
+    ]
+    return results, missing, chunks
+
+
+def _apply(results, missing, chunk, translations):
+    for text, by_language in zip(chunk, translations):
+        for language, translation in by_language.items():
+            translation_cache.set(text, language, api_version, translation)
+            for index in missing[normalize_text(text)][language]:
+                results[index][language] = translation
+
+
+def pack_texts(texts, target_count):
+    chunk = []
+    chunk_characters = 0
+
+    for text in texts:
+        characters = len(text) * target_count
+        if characters > max_characters_per_request:
+            raise TranslationError(
+                "Text exceeds the translation size limit.",
+                status_code=400,
+                details={"max_characters": max_characters_per_request // target_count},
+            )
+
+        if chunk and (len(chunk) >= max_elements_per_request
+                      or chunk_characters + characters > max_characters_per_request):
+            yield chunk
+            chunk = []
+            chunk_characters = 0
+
+        chunk.append(text)
+        chunk_characters += characters
+
+    if chunk:
+        yield chunk
+
+
+def _chunk_key(texts, target_languages):
+    payload = json.dumps([[normalize_text(text) for text in texts], target_languages, api_version],
+                         ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def translate_chunk(texts, target_languages):
+    return in_flight.run(_chunk_key(texts, target_languages), _request_translations, texts, target_languages)
+
+
+async def translate_chunk_async(texts, target_languages):
+    return await async_in_flight.run(
+        _chunk_key(texts, target_languages), _request_translations_async, texts, target_languages
+    )
+
+
+def _build_request(upstream, texts, target_languages):
+    headers = {
+        "Ocp-Apim-Subscription-Key": upstream.key,
+        "Ocp-Apim-Subscription-Region": upstream.region,
+        "Content-Type": "application/json"
+    }
+    body = [{"text": text} for text in texts]
+    params = {"api-version": api_version, "to": list(target_languages)}
+    return dict(headers=headers, json=body, params=params)
+
+
+def _parse_response(response, target_languages):
+    if response.status_code != 200:
+        try:
+            details = response.json()
+        except ValueError:
+            details = response.text
+        raise TranslationError("Translation failed.", status_code=response.status_code, details=details)
+
+    # Translations come back in the order of the `to` params.
+    return [
+        {language: item["text"] for language, item in zip(target_languages, entry["translations"])}
+        for entry in response.json()
+    ]
+
+
+def _check_status(response):
+    # Throttling and server errors are worth another attempt elsewhere; anything else is the answer.
+    if response.status_code in http_client.RETRY_STATUSES:
+        raise resilience.UpstreamFailure(response.status_code, response=response)
+    if response.status_code != 200:
+        metrics.upstream_errors.inc(service="translator", reason=response.status_code)
+    return response
+
+
+def _send(upstream, texts, target_languages):
+    request = _build_request(upstream, texts, target_languages)
+    try:
+        with metrics.stage("translator"):
+            response = http_client.post(upstream.url + '/translate', **request)
+    except requests.Timeout as e:
+        raise resilience.UpstreamFailure("timeout", details=str(e)) from e
+    except requests.RequestException as e:
+        raise resilience.UpstreamFailure("connection", details=str(e)) from e
+    return _check_status(response)
+
+
+async def _send_async(upstream, texts, target_languages):
+    request = _build_request(upstream, texts, target_languages)
+    try:
+        with metrics.stage("translator"):
+            response = await http_client.async_post(upstream.url + '/translate', **request)
+    except httpx.TimeoutException as e:
+        raise resilience.UpstreamFailure("timeout", details=str(e)) from e
+    except httpx.HTTPError as e:
+        raise resilience.UpstreamFailure("connection", details=str(e)) from e
+    return _check_status(response)
+
+
+def _translation_error(error):
+    if isinstance(error, resilience.CircuitOpen):
+        return TranslationError("Translation is temporarily unavailable.", status_code=503, details=str(error))
+    if error.reason == "timeout":
+        return TranslationError("Translation timed out.", status_code=504, details=error.details)
+    return TranslationError("An error occurred.", details=error.details)
+
+
+def _request_translations(texts, target_languages):
+    """Translations are idempotent, so slow calls are hedged and failed ones retried on the failover endpoint."""
+    send = functools.partial(_send, texts=texts, target_languages=target_languages)
+    try:
+        response = resilience.call(upstreams, send, hedge=True)
+    except resilience.UpstreamFailure as e:
+        if e.response is None:
+            raise _translation_error(e) from e
+        response = e.response
+    except resilience.CircuitOpen as e:
+        raise _translation_error(e) from e
+
+    return _parse_response(response, target_languages)
+
+
+async def _request_translations_async(texts, target_languages):
+    send = functools.partial(_send_async, texts=texts, target_languages=target_languages)
+    try:
+        response = await resilience.call_async(upstreams, send, hedge=True)
+    except resilience.UpstreamFailure as e:
+        if e.response is None:
+            raise _translation_error(e) from e
+        response = e.response
+    except resilience.CircuitOpen as e:
+        raise _translation_error(e) from e
+
+    return _parse_response(response, target_languages)
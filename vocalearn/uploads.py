@@ -0,0 +1,49 @@
+import hashlib
+
+from django.core.files.uploadhandler import FileUploadHandler
+
+DIGEST_CHUNK_SIZE = 64 * 1024
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """
+    Computes a SHA-256 of every uploaded file while its chunks stream in.
+
+    Installed ahead of Django's own handlers: each chunk is hashed and passed on
+    unchanged, so storage is still done by the memory/temporary-file handlers.
+    The hex digests end up in ``request.upload_digests``: a list per field name,
+    in upload order.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.digest.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if not hasattr(self.request, "upload_digests"):
+            self.request.upload_digests = {}
+        self.request.upload_digests.setdefault(self.field_name, []).append(self.digest.hexdigest())
+        return None
+
+
+def upload_digest(request, field_name, index=0):
+    """
+    Digest of the ``index``-th file uploaded as ``field_name``, as recorded by
+    HashingUploadHandler. Falls back to hashing the file when the handler did not
+    run (e.g. it was removed from FILE_UPLOAD_HANDLERS).
+    """
+    digests = (getattr(request, "upload_digests", None) or {}).get(field_name, [])
+    if index < len(digests):
+        return digests[index]
+
+    upload = request.FILES.getlist(field_name)[index]
+    digest = hashlib.sha256()
+    upload.seek(0)
+    for chunk in upload.chunks(DIGEST_CHUNK_SIZE):
+        digest.update(chunk)
+    upload.seek(0)
+    return digest.hexdigest()
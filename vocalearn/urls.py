@@ -2,13 +2,34 @@ from django.urls import path
 from django.conf import settings
 from django.conf.urls.static import static
 
-from . import views
+from . import views, async_views
 
 urlpatterns = [
     path("translate/", views.translate_text_view, name='translate_text'),
+    path("translate/batch/", views.translate_batch_view, name='translate-batch'),
+    path("translate/cache/", views.translation_cache_stats_view, name='translation-cache-stats'),
     path("speech/", views.speech_to_text_view, name="speech-to-text"),
+    path("speech/pool/", views.speech_pool_stats_view, name="speech-pool-stats"),
+    path("metrics/", views.metrics_view, name="metrics"),
     path('pronunciation/', views.pronunciation_assesment_view, name='pronunciation-assesment'),
+    path('pronunciation/batch/', views.pronunciation_batch_view, name='pronunciation-batch'),
+
+    # Reading passages registered once and referenced by passage_id in assessments
+    path("passages/", views.passage_list_view, name='passage-list'),
+    path("passages/<int:passage_id>/", views.passage_detail_view, name='passage-detail'),
+
+    # Long recordings: submit a job, then poll jobs/<id>/ for the result
+    path("jobs/speech/", views.speech_to_text_job_view, name='speech-to-text-job'),
+    path("jobs/pronunciation/", views.pronunciation_assesment_job_view, name='pronunciation-assesment-job'),
+    path("jobs/<uuid:job_id>/", views.job_detail_view, name='job-detail'),
+
+    # Native async versions, served without holding a thread when running under ASGI
+    path("async/translate/", async_views.translate_text_async_view, name='translate-text-async'),
+    path("async/translate/document/", async_views.translate_document_stream_view, name='translate-document-stream'),
+    path("async/speech/", async_views.speech_to_text_async_view, name='speech-to-text-async'),
+    path("async/speech/stream/", async_views.speech_to_text_stream_view, name='speech-to-text-stream'),
+    path('async/pronunciation/', async_views.pronunciation_assesment_async_view, name='pronunciation-assesment-async'),
 ]
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -0,0 +1,103 @@
+"""
+Energy-based voice-activity preprocessing of decoded PCM: trims leading and
+trailing silence and optionally normalizes loudness before the audio is sent
+to Azure, which bills (and waits on) every second it receives.
+"""
+import math
+
+import numpy as np
+from django.conf import settings
+
+from .audio import SAMPLE_RATE, SAMPLE_WIDTH
+
+FRAME_MS = 20
+FRAME_SAMPLES = SAMPLE_RATE * FRAME_MS // 1000
+FULL_SCALE = 32768
+
+
+def samples(pcm):
+    return np.frombuffer(pcm, dtype="<i2")
+
+
+def frame_rms(pcm):
+    """RMS of each complete FRAME_MS frame of 16-bit mono PCM."""
+    x = samples(pcm)
+    count = len(x) // FRAME_SAMPLES
+    frames = x[:count * FRAME_SAMPLES].reshape(count, FRAME_SAMPLES).astype(np.float64)
+    return np.sqrt(np.mean(frames * frames, axis=1))
+
+
+def energy_limit(energies, threshold):
+    """
+    Energy below which a frame counts as silence: ``threshold``, raised to twice
+    the recording's noise floor so background hiss is not mistaken for speech.
+    """
+    floor = np.sort(energies)[len(energies) // 50] if len(energies) else 0
+    return max(threshold, floor * 2)
+
+
+def trim_silence(pcm, threshold, padding_ms):
+    """
+    Cut leading and trailing silence, keeping ``padding_ms`` around the speech.
+    Returns ``(pcm, leading_seconds, trailing_seconds)``; audio with no frame
+    above the threshold is returned untouched.
+    """
+    energies = frame_rms(pcm)
+    voiced = np.flatnonzero(energies >= energy_limit(energies, threshold))
+    if not len(voiced):
+        return pcm, 0.0, 0.0
+
+    padding = padding_ms // FRAME_MS
+    frame_bytes = FRAME_SAMPLES * SAMPLE_WIDTH
+    start = max(int(voiced[0]) - padding, 0) * frame_bytes
+    end_frame = int(voiced[-1]) + 1 + padding
+    # The partial frame at the end is never measured; keep it whenever the padding reaches it.
+    end = len(pcm) if end_frame >= len(energies) else end_frame * frame_bytes
+
+    bytes_per_second = SAMPLE_RATE * SAMPLE_WIDTH
+    return pcm[start:end], start / bytes_per_second, (len(pcm) - end) / bytes_per_second
+
+
+def normalize_loudness(pcm, threshold, target_dbfs, max_gain_db):
+    """
+    Scale ``pcm`` so its speech frames average ``target_dbfs`` RMS, with the gain
+    capped at ``max_gain_db`` and at whatever keeps the peak from clipping.
+    Returns ``(pcm, gain_db)``.
+    """
+    x = samples(pcm)
+    energies = frame_rms(pcm)
+    voiced = energies[energies >= energy_limit(energies, threshold)]
+    peak = int(np.abs(x.astype(np.int32)).max()) if len(x) else 0
+    if not len(voiced) or peak == 0:
+        return pcm, 0.0
+
+    level = 20 * math.log10(math.sqrt(float(np.mean(voiced * voiced))) / FULL_SCALE)
+    gain_db = min(target_dbfs - level, max_gain_db, 20 * math.log10((FULL_SCALE - 1) / peak))
+    if abs(gain_db) < 0.5:
+        return pcm, 0.0
+
+    scaled = np.rint(x * 10 ** (gain_db / 20))
+    return np.clip(scaled, -FULL_SCALE, FULL_SCALE - 1).astype("<i2").tobytes(), gain_db
+
+
+def preprocess(pcm, endpoint):
+    """
+    Apply the AUDIO_PREPROCESSING stage configured for ``endpoint``
+    ('transcription' or 'pronunciation'). Returns the processed PCM and a report
+    of what was done, suitable for the response body. ``leading_seconds`` is the
+    audio cut from the start, which offsets into the processed PCM must add to
+    refer to the upload.
+    """
+    config = settings.AUDIO_PREPROCESSING[endpoint]
+    report = {"trimmed_seconds": 0.0, "leading_seconds": 0.0, "gain_db": 0.0}
+
+    if config["TRIM"]:
+        pcm, leading, trailing = trim_silence(pcm, config["THRESHOLD"], config["PADDING_MS"])
+        report["trimmed_seconds"] = round(leading + trailing, 3)
+        report["leading_seconds"] = round(leading, 3)
+
+    if config["NORMALIZE"]:
+        pcm, gain_db = normalize_loudness(pcm, config["THRESHOLD"], config["TARGET_DBFS"], config["MAX_GAIN_DB"])
+        report["gain_db"] = round(gain_db, 1)
+
+    return pcm, report
@@ -1,63 +1,78 @@
 from django.conf import settings
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET
 
 from rest_framework.response import Response
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, throttle_classes
 from rest_framework import status
 from django.conf import settings
 
-from pydub import AudioSegment
-
-from azure.cognitiveservices.speech import SpeechConfig, AudioConfig, SpeechRecognizer, ResultReason
-import azure.cognitiveservices.speech as speechsdk
-
-import requests, json, difflib
-import os, shutil, logging, time, string
+from azure.cognitiveservices.speech import SpeechRecognizer, ResultReason
+
+import logging
+
+from . import metrics, segmentation
+from .admission import (
+    admission_control, PronunciationBatchThrottle, PronunciationThrottle, SpeechThrottle, TranslateThrottle,
+)
+from .audio import get_processed_audio, get_audio_config, AudioDecodeError, DecoderUnavailable
+from .executor import get_batch_executor
+from .cache import speech_result_cache, translation_cache
+from .documents import translate_document
+from .jobs import purge_expired_jobs, submit_job, QueueFull
+from .models import Job, Passage
+from .pronunciation import create_pronunciation_recognizer, score_pronunciation
+from .scoring import aggregate_lesson
+from .serializers import JobSerializer, PassageSerializer
+from .speech_pool import get_speech_config, pool_stats
+from .recognition import (
+    create_transcription_recognizer, run_continuous_recognition, get_recognition_timeout, transcribe_split,
+    RecognitionFailed, RecognitionTimeout,
+)
+from .resilience import CircuitOpen
+from .translator import translate_texts, max_characters_per_request, TranslationError
+from .vad import preprocess
+from .uploads import upload_digest
+from .workspace import audio_workspace, WorkspaceFull
 
 speech_services_endpoint = settings.AZURE_SPEECH_ENDPOINT
-speech_services_key = settings.AZURE_SPEECH_KEY
-speech_services_region = 'southeastasia'
-
-text_api_key=settings.AZURE_TRANSLATE_KEY
-endpoint_text=settings.AZURE_TRANSLATE_API_ENDPOINT_TEXT
-endpoint_document=settings.AZURE_TRANSLATE_API_ENDPOINT_DOCUMENT
-
-region='southeastasia'
 
 logger = logging.getLogger(__name__)
 
-audio_files_directory = os.path.join(settings.MEDIA_ROOT, 'audio')
-
 @api_view(['POST'])
+@throttle_classes([TranslateThrottle])
+@admission_control("translate")
 def translate_text_view(request):
-    cleanup_directory(audio_files_directory)
     if request.method == 'POST':
-        path = '/translate'
-        constructed_url = endpoint_text + path
-        
+        if not isinstance(request.data, dict):
+            return Response({"error": "Request body must be a JSON object."}, status=400)
+
         text = request.data.get("text")
         target_language = request.data.get("to")
         
         if not text or not target_language:
                 return Response({"error": "Both 'text' and 'to' fields are required."}, status=400)
-    
-        headers = {
-            "Ocp-Apim-Subscription-Key": text_api_key,
-            "Ocp-Apim-Subscription-Region": 'global',
-            "Content-Type": "application/json"
-        }
 
-        body = [{"text": text}]
-        params = {"api-version": "3.0", "to": target_language}
+        if not isinstance(text, str) or not isinstance(target_language, str):
+            return Response({"error": "'text' and 'to' must be strings."}, status=400)
+
+        if len(text) > settings.TRANSLATION_DOCUMENT["MAX_CHARACTERS"]:
+            return Response({"error": "Text exceeds the translation size limit.",
+                             "details": {"max_characters": settings.TRANSLATION_DOCUMENT["MAX_CHARACTERS"]}},
+                            status=400)
 
         try:
-            response = requests.post(constructed_url, headers=headers, json=body, params=params)
-            
-            if response.status_code == 200:
-                translation = response.json()[0]["translations"][0]["text"]
-                return Response({"translation": translation})
+            if len(text) > max_characters_per_request:
+                # Too large for one Translator call: split at sentence boundaries instead.
+                translation = translate_document(text, target_language)
             else:
-                return Response({"error": "Translation failed.", "details": response.json()}, status=response.status_code)
-        
+                translation = translate_texts([text], [target_language])[0][target_language]
+            return Response({"translation": translation})
+
+        except TranslationError as e:
+            return Response({"error": str(e), "details": e.details}, status=e.status_code)
+
         except Exception as e:
             return Response({"error": "An error occurred.", "details": str(e)}, status=500)
 
@@ -66,41 +81,104 @@ def translate_text_view(request):
 
 
 @api_view(['POST'])
+@throttle_classes([TranslateThrottle])
+@admission_control("translate")
+def translate_batch_view(request):
+    if not isinstance(request.data, dict):
+        return Response({"error": "Request body must be a JSON object."}, status=400)
+
+    texts = request.data.get("texts")
+    target_languages = request.data.get("to")
+
+    if isinstance(target_languages, str):
+        target_languages = [target_languages]
+
+    if not isinstance(texts, list) or not texts or not all(isinstance(t, str) and t for t in texts):
+        return Response({"error": "'texts' must be a non-empty list of strings."}, status=400)
+
+    if (not isinstance(target_languages, list) or not target_languages
+            or not all(isinstance(language, str) and language for language in target_languages)):
+        return Response({"error": "'to' must be a language code or a non-empty list of them."}, status=400)
+
+    target_languages = list(dict.fromkeys(target_languages))
+
+    try:
+        translations = translate_texts(texts, target_languages)
+    except TranslationError as e:
+        return Response({"error": str(e), "details": e.details}, status=e.status_code)
+    except Exception as e:
+        return Response({"error": "An error occurred.", "details": str(e)}, status=500)
+
+    return Response({
+        "translations": [
+            {"text": text, "translations": by_language}
+            for text, by_language in zip(texts, translations)
+        ]
+    })
+
+
+@api_view(['GET'])
+def translation_cache_stats_view(request):
+    return Response(translation_cache.stats())
+
+
+@api_view(['POST'])
+@throttle_classes([SpeechThrottle])
+@admission_control("speech")
 def speech_to_text_view(request):
-    cleanup_directory(audio_files_directory)
-    audio_file = request.FILES.get("audio")
+    with metrics.stage("upload"):
+        audio_file = request.FILES.get("audio")
     target_language = request.data.get('target_language')
+    split = is_truthy(request.data.get('split'))
 
     if not audio_file:
         return Response({"error": "No audio file uploaded."}, status=status.HTTP_400_BAD_REQUEST)
 
-    if not audio_file:
-        return Response({"error": "No audio file uploaded."}, status=status.HTTP_400_BAD_REQUEST)
+    kind = "transcription-split" if split else "transcription"
+    cache_key = speech_result_cache.make_key(kind, upload_digest(request, "audio"), target_language)
+    cached = speech_result_cache.get(cache_key)
+    if cached is not None:
+        return Response({"status": "success", **cached})
+
+    try:
+        pcm, preprocessing = decode_upload(audio_file, "transcription")
+    except AudioDecodeError as e:
+        return Response({"error": f"Could not decode the audio file: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+    except DecoderUnavailable:
+        return Response({"error": "Audio decoding is unavailable."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    except WorkspaceFull as e:
+        return Response({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    return get_continuous_transcription(pcm, target_language, cache_key, split, preprocessing)
+
+
+def decode_upload(audio_file, endpoint):
+    """Decode an upload to PCM and run ``endpoint``'s preprocessing stage; returns ``(pcm, report)``."""
+    with metrics.stage("decode"), audio_workspace() as workspace:
+        pcm = get_processed_audio(audio_file, workspace)
+    with metrics.stage("preprocess"):
+        return preprocess(pcm, endpoint)
 
-    os.makedirs(audio_files_directory, exist_ok=True) 
-    audio_file_path = os.path.join(audio_files_directory, audio_file.name)
 
-    return get_continuous_transcription(audio_file, audio_file_path, audio_files_directory, target_language)
+def is_truthy(value):
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
     
     
-def get_transcribed_text(audio_file, audio_file_path, audio_files_directory, target_language):
+def get_transcribed_text(pcm, target_language):
     try:
-        speech_config = SpeechConfig(subscription=speech_services_key, region=region, speech_recognition_language=target_language)
-        audio_config = AudioConfig(filename=get_processed_audio_file_path(audio_file, audio_file_path, audio_files_directory))
+        speech_config = get_speech_config(target_language)
+        audio_config = get_audio_config(pcm)
         recognizer = SpeechRecognizer(speech_config=speech_config, audio_config=audio_config)
     
         result = recognizer.recognize_once()
         if result.reason == ResultReason.RecognizedSpeech:
             transcription = result.text
-            cleanup_directory(audio_files_directory)
             return Response({"status": "success", "transcription": transcription})
         
         elif result.reason == ResultReason.NoMatch:
-            cleanup_directory(audio_files_directory)
             return Response({"error": "No speech could be recognized."}, status=status.HTTP_400_BAD_REQUEST)
         
         else:
-            cleanup_directory(audio_files_directory)
             return Response({"error": f"Speech recognition failed: {result.reason}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     except Exception as e:
@@ -108,199 +186,297 @@ def get_transcribed_text(audio_file, audio_file_path, audio_files_directory, tar
         return Response({"error": f"Error processing the audio file: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-def get_continuous_transcription(audio_file, audio_file_path, audio_files_directory, target_language):
+def get_continuous_transcription(pcm, target_language, cache_key=None, split=False, preprocessing=None):
+    """
+    Transcribe ``pcm`` in one recognizer session, or with ``split`` as chunks cut
+    at pauses and recognized in parallel (the response then also lists segments).
+    ``preprocessing`` is the report of the audio preprocessing stage, echoed back.
+    """
     try:
-        speech_config = speechsdk.SpeechConfig(
-            subscription=speech_services_key,
-            region=region,
-            speech_recognition_language=target_language,
-        )
-        audio_config = speechsdk.audio.AudioConfig(filename=get_processed_audio_file_path(
-            audio_file, audio_file_path, audio_files_directory)
-        )
-        speech_recognizer = speechsdk.SpeechRecognizer(speech_config=speech_config, audio_config=audio_config)
-
-        recognized_text = []
-        done = False
-
-        def stop_cb(evt: speechsdk.SessionEventArgs):
-            # print("CLOSING on {}".format(evt))
-            nonlocal done
-            done = True
-
-        speech_recognizer.recognizing.connect(lambda evt: print("RECOGNIZING: {}".format(evt.result.text)))
-        speech_recognizer.recognized.connect(lambda evt: recognized_text.append(evt.result.text))
-        speech_recognizer.session_started.connect(lambda evt: print("SESSION STARTED: {}".format(evt)))
-        speech_recognizer.session_stopped.connect(lambda evt: print("SESSION STOPPED: {}".format(evt)))
-        speech_recognizer.canceled.connect(lambda evt: print("CANCELED: {}".format(evt)))
-        speech_recognizer.session_stopped.connect(stop_cb)
-        speech_recognizer.canceled.connect(stop_cb)
-
-        # print("Starting continuous recognition")
-        speech_recognizer.start_continuous_recognition()
-
-        while not done:
-            time.sleep(0.5)
-
-        speech_recognizer.stop_continuous_recognition()
-        full_transcription = " ".join(recognized_text)
-
-        return Response({"status": "success", "transcription": full_transcription})
+        if split:
+            leading = preprocessing["leading_seconds"] if preprocessing is not None else 0.0
+            result = transcribe_split(pcm, target_language, leading)
+        else:
+            speech_recognizer, recognized_text = create_transcription_recognizer(pcm, target_language)
+
+            run_continuous_recognition(speech_recognizer, get_recognition_timeout(pcm))
+            result = {"transcription": " ".join(recognized_text)}
+
+        if preprocessing is not None:
+            result["preprocessing"] = preprocessing
+        if cache_key is not None:
+            speech_result_cache.set(cache_key, result)
+        return Response({"status": "success", **result})
+
+    except RecognitionTimeout as e:
+        return Response({"error": str(e)}, status=status.HTTP_504_GATEWAY_TIMEOUT)
+
+    except RecognitionFailed as e:
+        return Response({"error": str(e)}, status=status.HTTP_502_BAD_GATEWAY)
+
+    except CircuitOpen as e:
+        return Response({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
     except Exception as e:
         logger.error(f"Error during continuous recognition: {e}", exc_info=True)
         return Response({"error": f"Error during continuous recognition: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+def speech_pool_stats_view(request):
+    return Response({**pool_stats(), "segmentation": segmentation.cache_stats(),
+                     "results": speech_result_cache.stats()})
+
+
+@require_GET
+def metrics_view(request):
+    # Plain Django view: Prometheus expects its text format, not a DRF-rendered body.
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def get_reference(data):
+    """
+    Resolve what an assessment is scored against: the registered passage named by
+    ``passage_id`` if given, otherwise the raw ``reference_text``.
+
+    Returns ``(reference_text, target_language, reference_words)``; the words are
+    None for raw text, which is tokenized at scoring time. Raises
+    Passage.DoesNotExist for an unknown passage.
+    """
+    passage_id = data.get('passage_id')
+    if not passage_id:
+        return data.get('reference_text'), data.get('target_language'), None
+
+    if not str(passage_id).isdigit():
+        raise Passage.DoesNotExist
+    passage = Passage.objects.get(pk=int(passage_id))
+    return passage.text, passage.language, passage.tokens
+
+
 @api_view(['POST'])
+@throttle_classes([PronunciationThrottle])
+@admission_control("pronunciation")
 def pronunciation_assesment_view(request):
-    cleanup_directory(audio_files_directory)
-    
-    audio_file = request.FILES.get('audio')
-    os.makedirs(audio_files_directory, exist_ok=True) 
-    
-    audio_file_path = os.path.join(audio_files_directory, audio_file.name)
+    with metrics.stage("upload"):
+        audio_file = request.FILES.get('audio')
+    try:
+        reference_text, target_language, reference_words = get_reference(request.data)
+    except Passage.DoesNotExist:
+        return Response({"error": "Passage not found."}, status=status.HTTP_404_NOT_FOUND)
 
-    speech_config = speechsdk.SpeechConfig(subscription=speech_services_key, region=speech_services_region)
-    audio_config = speechsdk.audio.AudioConfig(filename=get_processed_audio_file_path(audio_file, audio_file_path, audio_files_directory))
+    if not audio_file or not target_language or not reference_text:
+        return Response({"error": "Something is missing"}, status=status.HTTP_400_BAD_REQUEST)
 
-    reference_text = request.data.get('reference_text')
-    enable_miscue = True
-    enable_prosody_assessment = True
-    
-    pronunciation_config = speechsdk.PronunciationAssessmentConfig(
-        reference_text=reference_text,
-        grading_system=speechsdk.PronunciationAssessmentGradingSystem.HundredMark,
-        granularity=speechsdk.PronunciationAssessmentGranularity.Phoneme,
-        enable_miscue=enable_miscue)
-    
-    if enable_prosody_assessment:
-        pronunciation_config.enable_prosody_assessment()
-    
+    try:
+        scores = assess_clip(audio_file, upload_digest(request, "audio"), reference_text, target_language,
+                             reference_words, details=is_truthy(request.data.get('details')))
+    except AudioDecodeError as e:
+        return Response({"error": f"Could not decode the audio file: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+    except DecoderUnavailable:
+        return Response({"error": "Audio decoding is unavailable."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    except WorkspaceFull as e:
+        return Response({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    except RecognitionTimeout as e:
+        return Response({"error": str(e)}, status=status.HTTP_504_GATEWAY_TIMEOUT)
+    except RecognitionFailed as e:
+        return Response({"error": str(e)}, status=status.HTTP_502_BAD_GATEWAY)
+    except CircuitOpen as e:
+        return Response({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    return Response({"status": "success", **scores}, status=status.HTTP_200_OK)
+
+
+def assess_clip(audio_file, digest, reference_text, target_language, reference_words=None, details=False):
+    """
+    Score one uploaded clip against its reference, answering from the result cache
+    when the same audio was already assessed against the same text. Raises
+    AudioDecodeError, WorkspaceFull, RecognitionTimeout, RecognitionFailed or
+    CircuitOpen.
+    """
+    cache_key = speech_result_cache.make_key(
+        "pronunciation-details" if details else "pronunciation", digest, target_language, reference_text,
+    )
+    cached = speech_result_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    pcm, preprocessing = decode_upload(audio_file, "pronunciation")
+    speech_recognizer, results = create_pronunciation_recognizer(pcm, reference_text, target_language)
+    run_continuous_recognition(speech_recognizer, get_recognition_timeout(pcm))
+
+    scores = score_pronunciation(
+        results, reference_text, target_language, reference_words=reference_words, include_words=details,
+        offset=preprocessing["leading_seconds"],
+    )
+    scores["preprocessing"] = preprocessing
+    speech_result_cache.set(cache_key, scores)
+    return scores
+
+
+def batch_sessions(request):
+    # Each clip is its own recognizer session; the batch pool runs up to CONCURRENCY of them at once.
+    return min(len(request.FILES.getlist('audio')), settings.PRONUNCIATION_BATCH["CONCURRENCY"])
+
+
+@api_view(['POST'])
+@throttle_classes([PronunciationBatchThrottle])
+@admission_control("pronunciation", sessions=batch_sessions)
+def pronunciation_batch_view(request):
+    """
+    Assess a lesson's clips in one request: repeated ``audio`` files paired by
+    position with repeated ``reference_text`` (or ``passage_id``) values. Clips
+    run concurrently on the batch pool; each gets its own result or error, and
+    the lesson aggregates cover the clips that succeeded.
+    """
+    with metrics.stage("upload"):
+        audio_files = request.FILES.getlist('audio')
+    passage_ids = request.data.getlist('passage_id') if hasattr(request.data, 'getlist') else []
+    reference_texts = request.data.getlist('reference_text') if hasattr(request.data, 'getlist') else []
     target_language = request.data.get('target_language')
-    speech_recognizer = speechsdk.SpeechRecognizer(speech_config=speech_config, language=target_language, audio_config=audio_config)
-    pronunciation_config.apply_to(speech_recognizer)
-
-    done = False
-    recognized_words = []
-    prosody_scores = []
-    fluency_scores = []
-    durations = []
-
-    def stop_cb(evt: speechsdk.SessionEventArgs):
-        """callback that signals to stop continuous recognition upon receiving an event `evt`"""
-        # print('CLOSING on {}'.format(evt))
-        nonlocal done
-        done = True
-
-    def recognized(evt: speechsdk.SpeechRecognitionEventArgs):
-        pronunciation_result = speechsdk.PronunciationAssessmentResult(evt.result)
-        nonlocal recognized_words, prosody_scores, fluency_scores, durations
-        recognized_words += pronunciation_result.words
-        fluency_scores.append(pronunciation_result.fluency_score)
-        if pronunciation_result.prosody_score is not None:
-            prosody_scores.append(pronunciation_result.prosody_score)
-
-        json_result = evt.result.properties.get(speechsdk.PropertyId.SpeechServiceResponse_JsonResult)
-        jo = json.loads(json_result)
-        nb = jo["NBest"][0]
-        durations.append(sum([int(w["Duration"]) for w in nb["Words"]]))
-
-    speech_recognizer.recognized.connect(recognized)
-    speech_recognizer.session_started.connect(lambda evt: print('SESSION STARTED: {}'.format(evt)))
-    speech_recognizer.session_stopped.connect(lambda evt: print('SESSION STOPPED {}'.format(evt)))
-    speech_recognizer.canceled.connect(lambda evt: print('CANCELED {}'.format(evt)))
-    speech_recognizer.session_stopped.connect(stop_cb)
-    speech_recognizer.canceled.connect(stop_cb)
-
-    speech_recognizer.start_continuous_recognition()
-    while not done:
-        time.sleep(.5)
-
-    if target_language == 'zh-CN':
-        import jieba
-        import zhon.hanzi
-        jieba.suggest_freq([x.word for x in recognized_words], True)
-        reference_words = [w for w in jieba.cut(reference_text) if w not in zhon.hanzi.punctuation]
-    else:
-        reference_words = [w.strip(string.punctuation) for w in reference_text.lower().split()]
-
-    if enable_miscue:
-        diff = difflib.SequenceMatcher(None, reference_words, [x.word.lower() for x in recognized_words])
-        final_words = []
-        for tag, i1, i2, j1, j2 in diff.get_opcodes():
-            if tag in ['insert', 'replace']:
-                for word in recognized_words[j1:j2]:
-                    if word.error_type == 'None':
-                        word._error_type = 'Insertion'
-                    final_words.append(word)
-            if tag in ['delete', 'replace']:
-                for word_text in reference_words[i1:i2]:
-                    word = speechsdk.PronunciationAssessmentWordResult({
-                        'Word': word_text,
-                        'PronunciationAssessment': {
-                            'ErrorType': 'Omission',
-                        }
-                    })
-                    final_words.append(word)
-            if tag == 'equal':
-                final_words += recognized_words[j1:j2]
+    details = is_truthy(request.data.get('details'))
+    max_clips = settings.PRONUNCIATION_BATCH["MAX_CLIPS"]
+
+    if not audio_files:
+        return Response({"error": "No audio files uploaded."}, status=status.HTTP_400_BAD_REQUEST)
+    if len(audio_files) > max_clips:
+        return Response({"error": f"At most {max_clips} clips can be assessed per request."},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    references = []
+    if passage_ids:
+        passages = {str(p.pk): p for p in Passage.objects.filter(pk__in=[p for p in passage_ids if p.isdigit()])}
+        for passage_id in passage_ids:
+            if passage_id not in passages:
+                return Response({"error": f"Passage {passage_id} not found."}, status=status.HTTP_404_NOT_FOUND)
+            passage = passages[passage_id]
+            references.append((passage.text, passage.language, passage.tokens))
     else:
-        final_words = recognized_words
+        references = [(text, target_language, None) for text in reference_texts]
 
-    final_accuracy_scores = []
-    for word in final_words:
-        if word.error_type == 'Insertion':
-            continue
-        else:
-            final_accuracy_scores.append(word.accuracy_score)
+    if len(references) != len(audio_files) or not all(text and language for text, language, _ in references):
+        return Response({"error": "Each audio file needs a reference_text or passage_id, and a target_language."},
+                        status=status.HTTP_400_BAD_REQUEST)
 
-    accuracy_score = sum(final_accuracy_scores) / len(final_accuracy_scores)
-    
-    
-    if len(prosody_scores) == 0:
-        prosody_score = "nan"
-    else:
-        prosody_score = sum(prosody_scores) / len(prosody_scores)
-    
-    fluency_score = sum([x * y for (x, y) in zip(fluency_scores, durations)]) / sum(durations)
-    
-    completeness_score = len([w for w in recognized_words if w.error_type == "None"]) / len(reference_words) * 100
-    completeness_score = completeness_score if completeness_score <= 100 else 100
-    speech_recognizer.stop_continuous_recognition()
+    executor = get_batch_executor()
+    futures = [
+        metrics.submit(executor, assess_batch_clip, index, audio_file, upload_digest(request, 'audio', index),
+                       text, language, words, details)
+        for index, (audio_file, (text, language, words)) in enumerate(zip(audio_files, references))
+    ]
+    clips = [future.result() for future in futures]
 
-    if not audio_file or not target_language or not reference_text:
-        return Response({"error": "Something is missing"}, status=status.HTTP_400_BAD_REQUEST)
-    else:
-        return Response({"status": "success", "accuracyScore": accuracy_score, "prosodyScore": prosody_score,
-                          "completenessScore": completeness_score, "fluency_score": fluency_score}, status=status.HTTP_200_OK)
-    
+    succeeded = [clip for clip in clips if clip["status"] == "success"]
+    lesson = {"clips": len(clips), "succeeded": len(succeeded), "failed": len(clips) - len(succeeded),
+              **aggregate_lesson(succeeded)}
+    return Response({"status": "success", "lesson": lesson, "clips": clips}, status=status.HTTP_200_OK)
 
 
-def get_processed_audio_file_path(audio_file, audio_file_path, audio_files_directory):
+def assess_batch_clip(index, audio_file, digest, reference_text, target_language, reference_words, details):
     try:
-        with open(audio_file_path, "wb") as f:
-            for chunk in audio_file.chunks():
-                f.write(chunk)
+        return {"index": index, "status": "success",
+                **assess_clip(audio_file, digest, reference_text, target_language, reference_words, details)}
+    except AudioDecodeError as e:
+        error, code = f"Could not decode the audio file: {e}", status.HTTP_400_BAD_REQUEST
+    except DecoderUnavailable:
+        error, code = "Audio decoding is unavailable.", status.HTTP_500_INTERNAL_SERVER_ERROR
+    except WorkspaceFull as e:
+        error, code = str(e), status.HTTP_503_SERVICE_UNAVAILABLE
+    except RecognitionTimeout as e:
+        error, code = str(e), status.HTTP_504_GATEWAY_TIMEOUT
+    except RecognitionFailed as e:
+        error, code = str(e), status.HTTP_502_BAD_GATEWAY
+    except CircuitOpen as e:
+        error, code = str(e), status.HTTP_503_SERVICE_UNAVAILABLE
+    except Exception as e:
+        logger.error(f"Error assessing clip {index}: {e}", exc_info=True)
+        error, code = f"Error during pronunciation assessment: {e}", status.HTTP_500_INTERNAL_SERVER_ERROR
+    return {"index": index, "status": "error", "error": error, "code": code}
 
-        processed_audio_path = os.path.join(audio_files_directory, "processed_" + audio_file.name)
-        audio = AudioSegment.from_file(audio_file_path)
-        audio = audio.set_channels(1).set_frame_rate(16000).set_sample_width(2)
-        audio.export(processed_audio_path, format="wav")
 
-        return processed_audio_path
+# Jobs are rate limited only: the job queues already bound how many run at once.
+@api_view(['POST'])
+@throttle_classes([SpeechThrottle])
+def speech_to_text_job_view(request):
+    with metrics.stage("upload"):
+        audio_file = request.FILES.get("audio")
+    target_language = request.data.get('target_language')
 
-    except Exception as e:
-        return Response(None)
+    if not audio_file:
+        return Response({"error": "No audio file uploaded."}, status=status.HTTP_400_BAD_REQUEST)
+
+    params = {"target_language": target_language, "split": is_truthy(request.data.get('split'))}
+    return submit_audio_job(request, Job.KIND_TRANSCRIPTION, audio_file, params)
 
 
-def cleanup_directory(directory):
+@api_view(['POST'])
+@throttle_classes([PronunciationThrottle])
+def pronunciation_assesment_job_view(request):
+    with metrics.stage("upload"):
+        audio_file = request.FILES.get('audio')
     try:
-        if os.path.exists(directory):
-            # print(directory)
-            shutil.rmtree(directory)
-        
-        os.makedirs(directory)
-        return "Directory reset successfully."
-    except Exception as e:
-        return f"Error: {str(e)}"
\ No newline at end of file
+        reference_text, target_language, reference_words = get_reference(request.data)
+    except Passage.DoesNotExist:
+        return Response({"error": "Passage not found."}, status=status.HTTP_404_NOT_FOUND)
+
+    if not audio_file or not target_language or not reference_text:
+        return Response({"error": "Something is missing"}, status=status.HTTP_400_BAD_REQUEST)
+
+    params = {"reference_text": reference_text, "target_language": target_language,
+              "reference_words": reference_words, "details": is_truthy(request.data.get('details'))}
+    return submit_audio_job(request, Job.KIND_PRONUNCIATION, audio_file, params)
+
+
+def submit_audio_job(request, kind, audio_file, params):
+    try:
+        pcm, preprocessing = decode_upload(audio_file, kind)
+        params["offset"] = preprocessing["leading_seconds"]
+        job = submit_job(kind, pcm, params, user=request.user)
+    except AudioDecodeError as e:
+        return Response({"error": f"Could not decode the audio file: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+    except DecoderUnavailable:
+        return Response({"error": "Audio decoding is unavailable."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    except (WorkspaceFull, QueueFull) as e:
+        return Response({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+def job_detail_view(request, job_id):
+    # Clients poll here, so orphaned jobs are failed even when no new ones are submitted.
+    purge_expired_jobs()
+    job = get_object_or_404(Job, pk=job_id)
+    if job.user_id is not None and job.user_id != request.user.pk:
+        return Response({"error": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+    return Response(JobSerializer(job).data)
+
+
+@api_view(['GET', 'POST'])
+def passage_list_view(request):
+    if request.method == 'GET':
+        passages = Passage.objects.all()
+        language = request.query_params.get('language')
+        if language:
+            passages = passages.filter(language=language)
+        return Response(PassageSerializer(passages, many=True).data)
+
+    if not request.user.is_authenticated:
+        return Response({"error": "Authentication required."}, status=status.HTTP_401_UNAUTHORIZED)
+
+    serializer = PassageSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    serializer.save(created_by=request.user)
+    return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET', 'DELETE'])
+def passage_detail_view(request, passage_id):
+    passage = get_object_or_404(Passage, pk=passage_id)
+    if request.method == 'GET':
+        return Response(PassageSerializer(passage).data)
+
+    if not (request.user.is_staff or (passage.created_by_id is not None and passage.created_by_id == request.user.pk)):
+        return Response({"error": "You cannot delete this passage."}, status=status.HTTP_403_FORBIDDEN)
+    passage.delete()
+    return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,124 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_janitor = None
+_janitor_pid = None
+_janitor_lock = threading.Lock()
+
+
+class WorkspaceFull(Exception):
+    pass
+
+
+class Workspace:
+    """
+    Scratch directory owned by a single request. The directory is only created
+    the first time a file is needed, so requests that stay in memory never touch
+    the disk.
+    """
+
+    prefix = "req-"
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.directory = None
+
+    def file_path(self, name, size=0):
+        if self.directory is None:
+            os.makedirs(self.root, exist_ok=True)
+            self._check_capacity(size)
+            self.directory = tempfile.mkdtemp(prefix=self.prefix, dir=self.root)
+        else:
+            self._check_capacity(size)
+        return os.path.join(self.directory, os.path.basename(name) or "upload")
+
+    def _check_capacity(self, size):
+        if self.max_bytes and directory_size(self.root) + size > self.max_bytes:
+            raise WorkspaceFull("Audio workspace is full, try again later.")
+
+    def cleanup(self):
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+
+
+@contextmanager
+def audio_workspace():
+    config = settings.AUDIO_WORKSPACE
+    start_janitor()
+    workspace = Workspace(config["ROOT"], config["MAX_BYTES"])
+    try:
+        yield workspace
+    finally:
+        workspace.cleanup()
+
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def reap_orphans(root, max_age):
+    """Remove workspaces left behind by requests that never cleaned up (e.g. a killed worker)."""
+    if not os.path.isdir(root):
+        return 0
+
+    cutoff = time.time() - max_age
+    reaped = 0
+    with os.scandir(root) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False) and entry.stat().st_mtime < cutoff:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    reaped += 1
+            except OSError:
+                continue
+    return reaped
+
+
+def _janitor_loop(root, max_age, interval):
+    while True:
+        try:
+            reaped = reap_orphans(root, max_age)
+            if reaped:
+                logger.info("Reaped %s orphaned audio workspaces", reaped)
+        except Exception:
+            logger.exception("Audio workspace janitor failed")
+        time.sleep(interval)
+
+
+def start_janitor():
+    global _janitor, _janitor_pid
+
+    pid = os.getpid()
+    if _janitor_pid == pid:
+        return
+
+    with _janitor_lock:
+        if _janitor_pid == pid:
+            return
+        config = settings.AUDIO_WORKSPACE
+        _janitor = threading.Thread(
+            target=_janitor_loop,
+            args=(config["ROOT"], config["MAX_AGE"], config["JANITOR_INTERVAL"]),
+            name="audio-workspace-janitor",
+            daemon=True,
+        )
+        _janitor.start()
+        _janitor_pid = pid
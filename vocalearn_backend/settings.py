@@ -39,6 +39,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'vocalearn.middleware.RequestIdMiddleware',
+    'vocalearn.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     "corsheaders.middleware.CorsMiddleware",
@@ -70,6 +72,10 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'vocalearn_backend.wsgi.application'
+ASGI_APPLICATION = 'vocalearn_backend.asgi.application'
+
+# Threads available to the async views for transcoding, scoring and blocking SDK calls
+ASYNC_EXECUTOR_WORKERS = env.int('ASYNC_EXECUTOR_WORKERS', 8)
 
 
 # Database
@@ -122,6 +128,35 @@ STATIC_URL = 'static/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+# Audio uploads are decoded in memory by piping them through ffmpeg
+FFMPEG_BINARY = env('FFMPEG_BINARY', 'ffmpeg')
+FFMPEG_TIMEOUT = env.int('FFMPEG_TIMEOUT', 120)
+
+# Per-request scratch directories, only used when an upload has to be spooled to disk
+AUDIO_WORKSPACE = {
+    'ROOT': env('AUDIO_WORKSPACE_ROOT', os.path.join(MEDIA_ROOT, 'audio')),
+    'MAX_BYTES': env.int('AUDIO_WORKSPACE_MAX_BYTES', 512 * 1024 * 1024),
+    # Workspaces older than this are orphans of killed requests and get reaped
+    'MAX_AGE': env.int('AUDIO_WORKSPACE_MAX_AGE', 60 * 60),
+    'JANITOR_INTERVAL': env.int('AUDIO_WORKSPACE_JANITOR_INTERVAL', 5 * 60),
+}
+
+# In-process job queues for long recordings, one thread pool per queue
+JOB_QUEUES = {
+    'transcription': {
+        'CONCURRENCY': env.int('JOB_TRANSCRIPTION_CONCURRENCY', 2),
+        'MAX_PENDING': env.int('JOB_TRANSCRIPTION_MAX_PENDING', 50),
+    },
+    'pronunciation': {
+        'CONCURRENCY': env.int('JOB_PRONUNCIATION_CONCURRENCY', 2),
+        'MAX_PENDING': env.int('JOB_PRONUNCIATION_MAX_PENDING', 50),
+    },
+}
+JOB_AUDIO_ROOT = env('JOB_AUDIO_ROOT', os.path.join(MEDIA_ROOT, 'jobs'))
+JOB_RETENTION = env.int('JOB_RETENTION', 60 * 60 * 24)
+# Seconds past its recognition timeout after which a running job is taken to be orphaned by a dead worker
+JOB_STALE_AFTER = env.int('JOB_STALE_AFTER', 600)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -130,10 +165,27 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'vocalearn.logs.JsonFormatter',
+        },
+    },
+    'filters': {
+        'request_id': {
+            '()': 'vocalearn.logs.RequestIdFilter',
+        },
+    },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
         },
+        # Written from Speech SDK callback threads: queued, and dropped rather than blocking when the queue is full
+        'speech_events': {
+            '()': 'vocalearn.logs.NonBlockingHandler',
+            'max_queued': env.int('SPEECH_EVENT_LOG_QUEUE', 10000),
+            'formatter': 'json',
+            'filters': ['request_id'],
+        },
     },
     'loggers': {
         '': {
@@ -141,9 +193,24 @@ LOGGING = {
             'level': 'INFO',
             'propagate': True,
         },
+        # httpx logs every request at INFO
+        'httpx': {
+            'level': 'WARNING',
+        },
+        # Recognizer session events; DEBUG adds (sampled) interim hypotheses
+        'vocalearn.speech': {
+            'handlers': ['speech_events'],
+            'level': env('SPEECH_EVENT_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
     },
 }
 
+# Interim hypotheses logged at DEBUG: one in INTERIM_EVERY per recognizer session
+SPEECH_EVENT_LOGGING = {
+    'INTERIM_EVERY': env.int('SPEECH_EVENT_LOG_INTERIM_EVERY', 10),
+}
+
 
 AZURE_TRANSLATE_KEY=env('AZURE_TRANSLATE_KEY', '')
 AZURE_SPEECH_KEY=env('AZURE_SPEECH_KEY', '')
@@ -151,6 +218,219 @@ AZURE_SPEECH_KEY=env('AZURE_SPEECH_KEY', '')
 AZURE_TRANSLATE_API_ENDPOINT_TEXT=env('AZURE_TRANSLATE_API_ENDPOINT_TEXT', '')
 AZURE_TRANSLATE_API_ENDPOINT_DOCUMENT=env('AZURE_TRANSLATE_API_ENDPOINT_DOCUMENT', '')
 AZURE_SPEECH_ENDPOINT=env('AZURE_SPEECH_ENDPOINT', '')
+AZURE_TRANSLATE_REGION=env('AZURE_TRANSLATE_REGION', 'global')
+AZURE_SPEECH_REGION=env('AZURE_SPEECH_REGION', 'southeastasia')
+
+# Secondary targets, used while the primary's circuit is open or when a call to it fails
+AZURE_TRANSLATE_FAILOVER_ENDPOINT=env('AZURE_TRANSLATE_FAILOVER_ENDPOINT', '')
+AZURE_TRANSLATE_FAILOVER_KEY=env('AZURE_TRANSLATE_FAILOVER_KEY', AZURE_TRANSLATE_KEY)
+AZURE_TRANSLATE_FAILOVER_REGION=env('AZURE_TRANSLATE_FAILOVER_REGION', AZURE_TRANSLATE_REGION)
+AZURE_SPEECH_FAILOVER_REGION=env('AZURE_SPEECH_FAILOVER_REGION', '')
+AZURE_SPEECH_FAILOVER_KEY=env('AZURE_SPEECH_FAILOVER_KEY', AZURE_SPEECH_KEY)
+# Seconds to wait for a recognizer to finish, on top of the clip's own duration
+SPEECH_RECOGNITION_TIMEOUT=env.int('SPEECH_RECOGNITION_TIMEOUT', 30)
+
+# Batch pronunciation assessment: clips per request, and clips assessed concurrently per worker
+PRONUNCIATION_BATCH = {
+    'MAX_CLIPS': env.int('PRONUNCIATION_BATCH_MAX_CLIPS', 30),
+    'CONCURRENCY': env.int('PRONUNCIATION_BATCH_CONCURRENCY', 4),
+}
+
+# Silence trimming and loudness normalization applied to decoded audio, per endpoint
+AUDIO_PREPROCESSING = {
+    'transcription': {
+        'TRIM': env.bool('TRANSCRIPTION_TRIM_SILENCE', True),
+        # RMS of 16-bit samples below which a frame counts as silence
+        'THRESHOLD': env.int('TRANSCRIPTION_SILENCE_THRESHOLD', 300),
+        'PADDING_MS': env.int('TRANSCRIPTION_TRIM_PADDING_MS', 250),
+        'NORMALIZE': env.bool('TRANSCRIPTION_NORMALIZE_LOUDNESS', False),
+        'TARGET_DBFS': env.float('TRANSCRIPTION_TARGET_DBFS', -20.0),
+        'MAX_GAIN_DB': env.float('TRANSCRIPTION_MAX_GAIN_DB', 20.0),
+    },
+    'pronunciation': {
+        'TRIM': env.bool('PRONUNCIATION_TRIM_SILENCE', True),
+        'THRESHOLD': env.int('PRONUNCIATION_SILENCE_THRESHOLD', 300),
+        # Generous padding so soft word onsets and endings are still assessed
+        'PADDING_MS': env.int('PRONUNCIATION_TRIM_PADDING_MS', 400),
+        'NORMALIZE': env.bool('PRONUNCIATION_NORMALIZE_LOUDNESS', False),
+        'TARGET_DBFS': env.float('PRONUNCIATION_TARGET_DBFS', -20.0),
+        'MAX_GAIN_DB': env.float('PRONUNCIATION_MAX_GAIN_DB', 20.0),
+    },
+}
+
+# Parallel transcription of long recordings, split at pauses into chunks
+SPEECH_SPLITTING = {
+    # Concurrent recognizer sessions per worker process
+    'MAX_SESSIONS': env.int('SPEECH_SPLITTING_MAX_SESSIONS', 4),
+    'TARGET_CHUNK_SECONDS': env.int('SPEECH_SPLITTING_TARGET_CHUNK_SECONDS', 20),
+    'MAX_CHUNK_SECONDS': env.int('SPEECH_SPLITTING_MAX_CHUNK_SECONDS', 45),
+    'MIN_SILENCE_MS': env.int('SPEECH_SPLITTING_MIN_SILENCE_MS', 300),
+    # RMS of 16-bit samples below which a frame counts as silence
+    'SILENCE_THRESHOLD': env.int('SPEECH_SPLITTING_SILENCE_THRESHOLD', 300),
+}
+
+# Speech SDK configs built once per worker and reused across requests
+SPEECH_CONFIG_POOL = {
+    'WARM_LANGUAGES': env.list('SPEECH_WARM_LANGUAGES', ['en-US', 'zh-CN']),
+    'MAX_LANGUAGES': env.int('SPEECH_CONFIG_POOL_MAX_LANGUAGES', 64),
+    'MAX_ASSESSMENT_CONFIGS': env.int('SPEECH_CONFIG_POOL_MAX_ASSESSMENT_CONFIGS', 1024),
+}
+
+# jieba segmentation for zh-CN reference texts
+CHINESE_SEGMENTATION = {
+    'PRELOAD': env.bool('CHINESE_SEGMENTATION_PRELOAD', True),
+    'CACHE_SIZE': env.int('CHINESE_SEGMENTATION_CACHE_SIZE', 2048),
+}
+AZURE_TRANSLATE_API_VERSION=env('AZURE_TRANSLATE_API_VERSION', '3.0')
+AZURE_TRANSLATE_MAX_ELEMENTS=env.int('AZURE_TRANSLATE_MAX_ELEMENTS', 1000)
+AZURE_TRANSLATE_MAX_CHARACTERS=env.int('AZURE_TRANSLATE_MAX_CHARACTERS', 50000)
+
+# Long texts are split at sentence boundaries into chunks translated concurrently
+TRANSLATION_DOCUMENT = {
+    # Smaller chunks mean more parallelism and a faster first chunk when streaming
+    'CHUNK_CHARACTERS': env.int('TRANSLATION_DOCUMENT_CHUNK_CHARACTERS', 4000),
+    'CONCURRENCY': env.int('TRANSLATION_DOCUMENT_CONCURRENCY', 8),
+    'MAX_CHARACTERS': env.int('TRANSLATION_DOCUMENT_MAX_CHARACTERS', 2000000),
+}
+
+# Pooled keep-alive client used for every HTTP call to Azure
+AZURE_HTTP = {
+    'POOL_CONNECTIONS': env.int('AZURE_HTTP_POOL_CONNECTIONS', 4),
+    'POOL_MAXSIZE': env.int('AZURE_HTTP_POOL_MAXSIZE', 32),
+    'CONNECT_TIMEOUT': env.float('AZURE_HTTP_CONNECT_TIMEOUT', 3.05),
+    'READ_TIMEOUT': env.float('AZURE_HTTP_READ_TIMEOUT', 15),
+    'MAX_RETRIES': env.int('AZURE_HTTP_MAX_RETRIES', 2),
+    'BACKOFF_FACTOR': env.float('AZURE_HTTP_BACKOFF_FACTOR', 0.3),
+}
+
+
+# Circuit breakers per Azure target, and hedging of Translator calls
+UPSTREAM_RESILIENCE = {
+    # Consecutive failures that open a target's circuit, and seconds before a probe call is let through
+    'FAILURE_THRESHOLD': env.int('UPSTREAM_FAILURE_THRESHOLD', 5),
+    'RESET_TIMEOUT': env.float('UPSTREAM_RESET_TIMEOUT', 30),
+    # A Translator call still running after HEDGE_QUANTILE of the target's recent latencies is sent again
+    # (and billed again); HEDGE_DEFAULT_DELAY applies until HEDGE_MIN_SAMPLES latencies are known
+    'HEDGE': env.bool('UPSTREAM_HEDGE', True),
+    'HEDGE_QUANTILE': env.float('UPSTREAM_HEDGE_QUANTILE', 0.95),
+    'HEDGE_MIN_SAMPLES': env.int('UPSTREAM_HEDGE_MIN_SAMPLES', 20),
+    'HEDGE_DEFAULT_DELAY': env.float('UPSTREAM_HEDGE_DEFAULT_DELAY', 1.0),
+    'HEDGE_MIN_DELAY': env.float('UPSTREAM_HEDGE_MIN_DELAY', 0.05),
+    'LATENCY_WINDOW': env.int('UPSTREAM_LATENCY_WINDOW', 200),
+    'HEDGE_WORKERS': env.int('UPSTREAM_HEDGE_WORKERS', 32),
+}
+
+# Caches shared by the workers, one alias per use so that culling one cannot evict another's entries.
+# The file, database and local-memory backends delete a third of their entries past MAX_ENTRIES; the
+# file cache also lists its whole directory on every write to find out whether to cull, so its aliases
+# are kept small. Memcached and Redis evict by themselves and take no MAX_ENTRIES; point CACHE_BACKEND
+# and CACHE_LOCATION at one of them for larger shared tiers.
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHE_BACKEND = env('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache')
+# The file cache's directory, or the memcached/Redis server; unused by the local-memory and database backends
+CACHE_LOCATION = env('CACHE_LOCATION', os.path.join(BASE_DIR, 'cache'))
+
+
+def cache_alias(name, max_entries, backend=CACHE_BACKEND):
+    if backend.endswith('.FileBasedCache'):
+        location = os.path.join(CACHE_LOCATION, name)
+    elif backend.endswith('.LocMemCache'):
+        # One dict per LOCATION, in each worker process
+        location = name
+    elif backend.endswith('.DatabaseCache'):
+        # One table per alias, created by manage.py createcachetable
+        location = f'cache_{name}'
+    else:
+        return {'BACKEND': backend, 'LOCATION': CACHE_LOCATION, 'KEY_PREFIX': name}
+    return {'BACKEND': backend, 'LOCATION': location, 'OPTIONS': {'MAX_ENTRIES': max_entries}}
+
+
+# Admission control writes to its cache several times per request, too often for the file cache. With
+# the file cache it therefore defaults to local memory, which counts rate and concurrency limits per
+# worker process: the limits a host enforces are the configured ones times the number of workers.
+# Memcached or Redis keep them shared by all workers.
+ADMISSION_CONTROL_CACHE_BACKEND = env(
+    'ADMISSION_CONTROL_CACHE_BACKEND',
+    'django.core.cache.backends.locmem.LocMemCache' if CACHE_BACKEND.endswith('.FileBasedCache') else CACHE_BACKEND,
+)
+
+CACHES = {
+    'default': cache_alias('default', env.int('CACHE_MAX_ENTRIES', 300)),
+    'translations': cache_alias('translations', env.int('TRANSLATION_CACHE_SHARED_MAX_ENTRIES', 1000)),
+    'speech_results': cache_alias('speech_results', env.int('SPEECH_RESULT_CACHE_SHARED_MAX_ENTRIES', 500)),
+    # Token buckets and concurrency leases; culling, which would free leases, needs this many live clients
+    'admission': cache_alias('admission', env.int('ADMISSION_CONTROL_CACHE_MAX_ENTRIES', 10000),
+                             backend=ADMISSION_CONTROL_CACHE_BACKEND),
+}
+
+TRANSLATION_CACHE = {
+    'MAX_ENTRIES': env.int('TRANSLATION_CACHE_MAX_ENTRIES', 10000),
+    'MAX_BYTES': env.int('TRANSLATION_CACHE_MAX_BYTES', 16 * 1024 * 1024),
+    'TTL': env.int('TRANSLATION_CACHE_TTL', 60 * 60 * 24 * 7),
+    # Django cache alias for the cross-worker tier, empty to keep it in-process only
+    'SHARED_BACKEND': env('TRANSLATION_CACHE_SHARED_BACKEND', 'translations'),
+}
+
+# Speech-to-text and pronunciation results, keyed by a hash of the uploaded audio
+SPEECH_RESULT_CACHE = {
+    'MAX_ENTRIES': env.int('SPEECH_RESULT_CACHE_MAX_ENTRIES', 5000),
+    'MAX_BYTES': env.int('SPEECH_RESULT_CACHE_MAX_BYTES', 16 * 1024 * 1024),
+    'TTL': env.int('SPEECH_RESULT_CACHE_TTL', 60 * 60 * 24),
+    'SHARED_BACKEND': env('SPEECH_RESULT_CACHE_SHARED_BACKEND', 'speech_results'),
+}
+
+# Latency histograms served at vocalearn/metrics/; Server-Timing headers show each request's stages
+METRICS = {
+    'SERVER_TIMING': env.bool('METRICS_SERVER_TIMING', True),
+    # Histogram bucket bounds in seconds
+    'BUCKETS': env.list('METRICS_BUCKETS', [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+                                            30.0, 60.0, 120.0], subcast=float),
+}
+
+# Rate and concurrency limits for the Azure-backed endpoints, kept in CACHE (see ADMISSION_CONTROL_CACHE_BACKEND)
+ADMISSION_CONTROL = {
+    'ENABLED': env.bool('ADMISSION_CONTROL_ENABLED', True),
+    'CACHE': env('ADMISSION_CONTROL_CACHE', 'admission'),
+    # Seconds after which the slot of a request that never released it (e.g. its worker died) is freed
+    'LEASE_TIMEOUT': env.int('ADMISSION_CONTROL_LEASE_TIMEOUT', 600),
+    # Concurrent requests per upstream service, across all workers
+    'POOLS': {
+        'speech': env.int('ADMISSION_SPEECH_CONCURRENCY', 20),
+        'translator': env.int('ADMISSION_TRANSLATOR_CONCURRENCY', 50),
+    },
+    # Requests per worker allowed to wait for a pool slot, and for how many seconds
+    'MAX_QUEUED': env.int('ADMISSION_CONTROL_MAX_QUEUED', 16),
+    'MAX_WAIT': env.float('ADMISSION_CONTROL_MAX_WAIT', 5.0),
+    # Per client (user, or address when anonymous): RATE requests per second up to a BURST, USER_CONCURRENCY at once
+    'SCOPES': {
+        'translate': {
+            'POOL': 'translator',
+            'RATE': env.float('ADMISSION_TRANSLATE_RATE', 2.0),
+            'BURST': env.int('ADMISSION_TRANSLATE_BURST', 30),
+            'USER_CONCURRENCY': env.int('ADMISSION_TRANSLATE_USER_CONCURRENCY', 4),
+        },
+        'speech': {
+            'POOL': 'speech',
+            'RATE': env.float('ADMISSION_SPEECH_RATE', 0.5),
+            'BURST': env.int('ADMISSION_SPEECH_BURST', 10),
+            'USER_CONCURRENCY': env.int('ADMISSION_SPEECH_USER_CONCURRENCY', 2),
+        },
+        'pronunciation': {
+            'POOL': 'speech',
+            'RATE': env.float('ADMISSION_PRONUNCIATION_RATE', 0.5),
+            'BURST': env.int('ADMISSION_PRONUNCIATION_BURST', 10),
+            'USER_CONCURRENCY': env.int('ADMISSION_PRONUNCIATION_USER_CONCURRENCY', 2),
+        },
+    },
+}
+
+# Hash uploads as they stream in so repeated clips can be answered from SPEECH_RESULT_CACHE
+FILE_UPLOAD_HANDLERS = [
+    'vocalearn.uploads.HashingUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
 
 
 DJOSER = {
@@ -176,4 +456,4 @@ SIMPLE_JWT = {
 AUTHENTICATION_BACKENDS = [
     'core.auth_backends.EmailOrUsernameModelBackend',
     'django.contrib.auth.backends.ModelBackend',
-]
\ No newline at end of file
+]
\ No newline at end of file